@@ -1,9 +1,10 @@
-from pygears import gear
-from pygears.typing import Ufixp, Integer, Fixpnumber
+import math
+from pygears import gear, Intf
+from pygears.typing import Bool, Fixp, Ufixp, Integer, Fixpnumber, Tuple, Uint
 from pygears.typing.math import ceil_div
 from pygears.typing.base import typeof
 from enum import IntEnum
-from pygears.lib import trunc, saturate, qround, pipeline, ccat, field_sel, cast
+from pygears.lib import trunc, saturate, qround, pipeline, ccat, field_sel, cast, sdp, void
 
 
 class Overflow(IntEnum):
@@ -236,3 +237,128 @@ def mux_dsp(sel, *din):
     mux_dsp(sel, din0, din1)
     """
     return field_sel(sel, ccat(*din))
+
+
+def fixp_bound(t):
+    """Returns the largest magnitude representable by the fixed point type t."""
+    return max(abs(float(t.fmin)), abs(float(t.fmax)))
+
+
+def coef_type(coef):
+    """Returns the type of the coefficient, given either as a constant or as an
+    interface."""
+    return coef.dtype if isinstance(coef, Intf) else type(coef)
+
+
+def coef_max_type(coefs):
+    """Returns the fixed point type which represents all the coefficients
+    without a loss, i.e. with the most integer and fraction bits among their
+    types."""
+    types = set(type(c) for c in coefs)
+    if len(types) == 1:
+        return types.pop()
+
+    signed = any(t.signed for t in types)
+    integer = max(t.integer + int(signed and not t.signed) for t in types)
+    fract = max(t.fract for t in types)
+
+    return (Fixp if signed else Ufixp)[integer, integer + fract]
+
+
+def coef_bound(coefs):
+    """Returns the L1 norm of the coefficients, i.e. the worst-case gain of the
+    sum of products with the coefficients. Coefficients given as interfaces
+    are bounded by their type."""
+    return sum(fixp_bound(c.dtype) if isinstance(c, Intf) else abs(float(c)) for c in coefs)
+
+
+def prune_type(t, bound):
+    """
+    Returns the fixed point type t with the integer part reduced to the minimum number of bits needed to represent
+    values of magnitude up to bound. The fractional part is left unchanged.
+    """
+    if bound > 0:
+        integer = max(1, math.floor(math.log2(bound)) + 2)
+    else:
+        integer = 1
+
+    integer = min(t.integer, integer)
+
+    return t.base[integer, t.fract + integer]
+
+
+@gear
+def prune(din, *, bound):
+    """
+    Removes the integer bits of the fixed point data which are not needed to represent values of magnitude up to
+    bound. Used to size sums by their worst-case bit growth instead of the full precision arithmetic.
+
+    Parameters
+    ----------
+    bound : float
+        Largest magnitude the data can reach.
+
+    Example
+    -------
+    prune(y_sum, bound=fixp_bound(din.dtype) * coef_bound(b))
+    """
+    return din | trunc(t=prune_type(din.dtype, bound))
+
+
+@gear
+async def coef_reg(din, cfg, *, init, init_valid) -> b'Tuple[din, cfg]':
+    """Holds the active coefficients in a register and pairs them with each data sample. A new set of coefficients
+    is taken from the cfg interface only together with a data sample, so that the swap is atomic. Until the register
+    is valid, only the cfg interface is read."""
+
+    coef = cfg.dtype(init)
+    valid = init_valid
+
+    while True:
+        if not valid:
+            async with cfg as cfg_data:
+                coef = cfg_data
+                valid = True
+        else:
+            async with din as data:
+                # swap in the new coefficients before the sample is processed
+                if not cfg.empty():
+                    coef = cfg.pull_nb()
+                    cfg.ack()
+
+                yield data, coef
+
+
+@gear
+def coef_sync(din, cfg, *, init=None):
+    """
+    Pairs each data sample with the currently active coefficients. Coefficients are double buffered: a new set of
+    coefficients waits on the cfg interface, while the active set is held in a register which is swapped atomically
+    between two data samples. Outputs a Tuple of the data sample and the coefficients.
+
+    Parameters
+    ----------
+    init : cfg.dtype
+        Coefficients active after reset. If omitted, data waits for the first coefficients on the cfg interface.
+
+    Example
+    -------
+    x, b = coef_sync(din, cfg, init=[Fixp[1, 15](0.5), Fixp[1, 15](0.5)])
+    """
+    if init is None:
+        return coef_reg(din, cfg, init=cfg.dtype(), init_valid=Bool(False))
+
+    return coef_reg(din, cfg, init=cfg.dtype(init), init_valid=Bool(True))
+
+
+@gear
+def rom_sdp(addr: Uint, *, data, dtype) -> b'dtype':
+    """
+    Read-only memory holding the data, kept in the sdp RAM that is never written. Read data is registered as with
+    rom, but a new address is accepted every clock cycle also in the simulation, where the rom takes two.
+
+    Example
+    -------
+    b_coef = tap_addr | rom_sdp(data=b, dtype=Fixp[1, 15])
+    """
+    return sdp(void(dtype=Tuple[addr.dtype, dtype]), addr, mem={i: dtype(d) for i, d in enumerate(data)})
@@ -0,0 +1,176 @@
+import math
+
+import numpy as np
+from scipy.signal import firwin2
+
+from pygears import Intf, gear
+from pygears.typing import Fixp, Uint, code
+from pygears.lib import decouple, dreg, trunc
+
+
+def cic_gain(order, ratio, diff_delay=1):
+    """Returns the DC gain of the decimating CIC filter."""
+
+    return (ratio * diff_delay)**order
+
+
+def cic_growth(order, ratio, diff_delay=1, interpolate=False):
+    """
+    Returns the number of bits the CIC registers need to grow above the input
+    width, as given by Hogenauer. The interpolating CIC output is not scaled by
+    the ratio, since every input sample is followed by ratio-1 zeros.
+    """
+
+    gain = cic_gain(order, ratio, diff_delay)
+    if interpolate:
+        gain = gain / ratio
+
+    return math.ceil(math.log2(gain))
+
+
+def cic_type(t, growth):
+    """Returns the Fixp type of the CIC registers for the input type t."""
+
+    return Fixp[t.integer + growth, t.width + growth]
+
+
+def cic_compensation(num, *, order, ratio, diff_delay=1, cutoff=0.5):
+    """
+    Designs coefficients of the FIR filter compensating the CIC passband droop,
+    to be run at the low rate after the CIC decimator (or before the CIC
+    interpolator) with fir_direct. Passband edge cutoff is relative to the low
+    rate Nyquist frequency. Returned coefficients are normalized to the unity DC
+    gain.
+    """
+
+    freq = np.linspace(0, 1, 256)
+
+    # inverse of the CIC frequency response within the passband
+    gain = np.zeros(len(freq))
+    for i, f in enumerate(freq):
+        if f <= cutoff:
+            w = math.pi * f * diff_delay / 2
+            gain[i] = 1 if w == 0 else abs(ratio * diff_delay * math.sin(w / (ratio * diff_delay)) / math.sin(w))**order
+
+    b = firwin2(num, freq, gain)
+    return b / sum(b)
+
+
+def wrap(din, *, t):
+    """Drops the MSBs of din that do not fit in the type t. Unlike trunc, which
+    keeps the sign, this wraps around in two's complement."""
+
+    return ((din >> Uint[din.dtype.width]) | trunc(t=Uint[t.width])) >> t
+
+
+def integrator(din, *, t):
+    """Accumulates din with the wrap-around in the registers of the type t."""
+
+    acc = Intf(t)
+    acc |= wrap(din + (acc | decouple(init=0)), t=t)
+    return acc
+
+
+def comb(din, *, t, diff_delay):
+    """Subtracts the diff_delay samples old din from din with the wrap-around
+    in the registers of the type t."""
+
+    delayed = din
+    for _ in range(diff_delay):
+        delayed = delayed | dreg(init=0)
+
+    return wrap(din - delayed, t=t)
+
+
+@gear
+async def downsample(din, *, ratio) -> b'din':
+    """Passes only every ratio-th din sample, starting with the last sample of
+    the first ratio samples."""
+
+    cnt = 0
+    while True:
+        async with din as data:
+            if cnt == ratio - 1:
+                yield data
+                cnt = 0
+            else:
+                cnt += 1
+
+
+@gear
+async def zero_stuff(din: Uint, *, ratio) -> b'din':
+    async with din as data:
+        yield data
+        for _ in range(ratio - 1):
+            yield code(0, din.dtype)
+
+
+@gear
+def upsample(din, *, ratio):
+    """Follows each din sample with ratio-1 zeros. Zeros are inserted into the
+    din code, since HLS cannot output the fixed point constants."""
+
+    return (din >> Uint[din.dtype.width] | zero_stuff(ratio=ratio)) >> din.dtype
+
+
+@gear
+def cic_decimate(din, *, order, ratio, diff_delay=1):
+    """
+    Multiplierless CIC decimator, with order integrators running at the input
+    rate followed by the order combs running at the rate reduced by ratio.
+
+    Registers grow by cic_growth bits, so the output type keeps the full CIC
+    gain, given by cic_gain, without the loss of precision. Integrators are
+    allowed to wrap around, since the combs cancel the overflows. Shifting
+    the output right by cic_growth bits normalizes it to the unity gain, for
+    the compensation filter with the unity DC gain.
+
+    Example
+    -------
+    x = din | cic_decimate(order=4, ratio=64)
+    (x >> cic_growth(4, 64)) | fir_direct(b=cic_compensation(15, order=4, ratio=64))
+    """
+
+    t = cic_type(din.dtype, cic_growth(order, ratio, diff_delay))
+
+    # integrators at the input rate
+    x = din
+    for _ in range(order):
+        x = integrator(x, t=t)
+
+    # reduce the rate
+    x = x | downsample(ratio=ratio)
+
+    # combs at the output rate
+    for _ in range(order):
+        x = comb(x, t=t, diff_delay=diff_delay)
+
+    return x
+
+
+@gear
+def cic_interpolate(din, *, order, ratio, diff_delay=1):
+    """
+    Multiplierless CIC interpolator, with order combs running at the input
+    rate followed by the order integrators running at the rate increased by
+    ratio.
+
+    Registers grow by cic_growth bits, so the output type keeps the full CIC
+    gain, given by cic_gain divided by ratio, without the loss of precision.
+    """
+
+    t = cic_type(din.dtype, cic_growth(order, ratio, diff_delay, interpolate=True))
+
+    # combs at the input rate
+    x = din | t
+    for _ in range(order):
+        x = comb(x, t=t, diff_delay=diff_delay)
+
+    # increase the rate by zero stuffing
+    x = x | upsample(ratio=ratio)
+
+    # integrators at the output rate
+    for _ in range(order):
+        x = integrator(x, t=t)
+
+    return x
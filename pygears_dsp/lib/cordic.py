@@ -1,7 +1,10 @@
 ''' Inspired by https://github.com/ZipCPU/cordic'''
-from pygears import gear
-from pygears.typing import Int, Uint, code
-from pygears.lib import ccat, when, field_sel
+from enum import IntEnum
+from functools import lru_cache
+
+from pygears import Intf, gear
+from pygears.typing import Array, Fixp, Int, Tuple, Uint, Ufixp, bitw, code
+from pygears.lib import ccat, decouple, rom, saturate, when, field_sel
 from pygears.lib import dreg
 from pygears.lib import union_collapse
 from pygears.lib import round_to_even
@@ -9,16 +12,52 @@ from pygears.lib.mux import mux
 import math
 
 
-def calc_cordic_angles(nstages, phase_bits):
-    angles = []
-    for k in range(nstages):
-        x = math.atan2(1, math.pow(2, k + 1))
-        deg = x * 180 / math.pi
+# number of distinct CORDIC configurations whose parameters are memoized
+CORDIC_PARAMS_CACHE_SIZE = 256
+
+
+class CordicMode(IntEnum):
+    CIRCULAR = 0
+    LINEAR = 1
+    HYPERBOLIC = 2
+
+
+def cordic_shifts(nstages, mode=CordicMode.CIRCULAR):
+    """Returns the shift of each stage. Linear stages start with no shift, so
+    that the quotients up to 2 converge, while the hyperbolic stages 4, 13, 40,
+    ... are repeated, without which the hyperbolic mode does not converge."""
+
+    shifts = []
+    shift = 0 if mode == CordicMode.LINEAR else 1
+    repeat = 4
+    while len(shifts) < nstages:
+        shifts.append(shift)
+        if mode == CordicMode.HYPERBOLIC and shift == repeat:
+            repeat = 3 * repeat + 1
+        else:
+            shift += 1
+
+    return shifts
+
 
+def calc_cordic_angle(shift, phase_bits, mode=CordicMode.CIRCULAR):
+    # in the circular mode 2**phase_bits corresponds to 2*pi, otherwise the
+    # phase is a signed fixed point number with two integer bits
+    if mode == CordicMode.CIRCULAR:
+        x = math.atan2(1, math.pow(2, shift))
         x = x * ((4 * (1 << (phase_bits - 2))) / (math.pi * 2))
-        phase_value = math.floor(x)
+    elif mode == CordicMode.LINEAR:
+        x = math.pow(2, -shift) * (1 << (phase_bits - 2))
+    else:
+        x = math.atanh(math.pow(2, -shift)) * (1 << (phase_bits - 2))
 
-        angles.append(phase_value)
+    return math.floor(x)
+
+
+def calc_cordic_angles(nstages, phase_bits, mode=CordicMode.CIRCULAR):
+    angles = []
+    for shift in cordic_shifts(nstages, mode):
+        angles.append(calc_cordic_angle(shift, phase_bits, mode))
 
     return angles
 
@@ -37,25 +76,29 @@ def calc_phase_bits(ww):
     return phase_bits
 
 
-def calc_stages(ww, pw):
+def calc_stages(ww, pw, mode=CordicMode.CIRCULAR):
     for nstages in range(0, 64):
-        x = math.atan2(1, math.pow(2, nstages + 1))
-        x *= (4 * (1 << (pw - 2))) / (math.pi * 2)
-        phase_value = math.floor(x)
+        shift = cordic_shifts(nstages + 1, mode)[-1]
 
-        if phase_value == 0:
+        if calc_cordic_angle(shift, pw, mode) == 0:
             break
-        if ww <= nstages:
+        if ww < shift:
             break
 
     return nstages
 
 
-def cordic_gain(nstages):
+def cordic_gain(nstages, mode=CordicMode.CIRCULAR):
     gain = 1
 
-    for i in range(nstages):
-        dgain = 1 + math.pow(2, -2 * (i + 1))
+    for shift in cordic_shifts(nstages, mode):
+        if mode == CordicMode.CIRCULAR:
+            dgain = 1 + math.pow(2, -2 * shift)
+        elif mode == CordicMode.HYPERBOLIC:
+            dgain = 1 - math.pow(2, -2 * shift)
+        else:
+            dgain = 1
+
         dgain = math.sqrt(dgain)
         gain *= dgain
 
@@ -64,35 +107,88 @@ def cordic_gain(nstages):
     return gain
 
 
-def cordic_params(iw, ow, nxtra=None, pw=None):
+@lru_cache(maxsize=CORDIC_PARAMS_CACHE_SIZE)
+def calc_cordic_params(iw, ow, nxtra, pw, mode):
+    ww = max(ow, iw) + nxtra + 1
+
+    if pw is None:
+        pw = calc_phase_bits(ww) if mode == CordicMode.CIRCULAR else ww
+    nstages = calc_stages(ww, pw, mode)
+    gain = cordic_gain(nstages, mode)
+
+    # angles are shared by all the callers, so they are returned immutable
+    cordic_angles = tuple(calc_cordic_angles(nstages, pw, mode))
+    # print("iw: ", iw, "\now: ", ow, "\nww: ", ww, "\npw: ", pw, "\nnstages: ",
+    #       nstages, "\nnxtra: ", nxtra, "\ngain: ", gain)
+    return pw, ww, nstages, cordic_angles, gain
+
+
+def cordic_params(iw, ow, nxtra=None, pw=None, mode=CordicMode.CIRCULAR):
+    """
+    Returns the phase width, the working width, the number of stages, the
+    tuple of the stage angles and the gain correction of the CORDIC with the
+    given widths. Results are memoized on (iw, ow, nxtra, pw, mode), so that
+    the elaboration of many CORDIC instances of the same widths calculates
+    them only once, see calc_cordic_params.cache_info().
+    """
+
     # if iw <= 0 or ow <= 0 or pw < 3 or nxtra < 1:
     #     raise ValueError(f"Invalid CORDIC input arguments, iw({iw}), ow({ow}), pw({pw}), nxtra({nxtra})")
     if nxtra == None:
         nxtra = 2
 
-    nxtra += 1
-    ww = max(ow, iw) + nxtra
+    if pw is not None:
+        pw = int(pw)
 
-    if pw is None:
-        pw = calc_phase_bits(ww)
-    nstages = calc_stages(ww, pw)
-    gain = cordic_gain(nstages)
+    return calc_cordic_params(int(iw), int(ow), int(nxtra), pw, CordicMode(mode))
 
-    cordic_angles = calc_cordic_angles(nstages, pw)
-    # print("iw: ", iw, "\now: ", ow, "\nww: ", ww, "\npw: ", pw, "\nnstages: ",
-    #       nstages, "\nnxtra: ", nxtra, "\ngain: ", gain)
-    return pw, ww, nstages, cordic_angles, gain
+
+def cordic_params_table(iws, ows, nxtra=None, pw=None, mode=CordicMode.CIRCULAR):
+    """
+    Returns the dictionary of cordic_params for each combination of the input
+    widths iws and the output widths ows, keyed by (iw, ow). Can be used to
+    export the angle tables, or to precompute the parameters ahead of
+    elaborating a large design or sweeping the widths, since it fills the
+    cordic_params cache on the way.
+    """
+
+    return {(iw, ow): cordic_params(iw, ow, nxtra=nxtra, pw=pw, mode=mode) for iw in iws for ow in ows}
 
 
 @gear
-def cordic_stages(din, *, cordic_angles, nstages, ww, pw):
-    stage = din
-    for i in range(nstages):
+def cordic_stages(din,
+                  *,
+                  cordic_angles,
+                  nstages,
+                  ww,
+                  pw,
+                  vectoring=False,
+                  mode=CordicMode.CIRCULAR,
+                  stages_per_reg=1,
+                  start=0):
+    """
+    Chains the micro-rotations from the stage start up to nstages, with a
+    register after every stages_per_reg of them and after the last one, which
+    gives ceil((nstages - start)/stages_per_reg) cycles of latency. With
+    stages_per_reg=0 the chain is fully combinational.
+    """
+
+    # fields after the phase are delayed alongside the stages
+    stage = ccat(din[0], din[1], din[2])
+    side = [din[j] for j in range(3, len(din.dtype))]
+
+    for i in range(start, nstages):
         stage = stage \
-            | cordic_stage_hls(i=i, cordic_angle=cordic_angles[i], ww=ww, pw=pw) \
-            | dreg
+            | cordic_stage_hls(i=i, cordic_angle=cordic_angles[i], ww=ww, pw=pw, vectoring=vectoring, mode=mode)
+
+        if stages_per_reg and ((i + 1 - start) % stages_per_reg == 0 or i == nstages - 1):
+            stage = stage | dreg
+            side = [field | dreg for field in side]
 
-    return stage
+    if not side:
+        return stage
+
+    return ccat(stage[0], stage[1], stage[2], *side)
 
 
 @gear
@@ -137,28 +233,165 @@ def cordic_stage(din, *, i, cordic_angle, ww, pw):
     return din | when(pol, f=ph_neg, fe=ph_pos)
 
 
+def cordic_micro_rotation(xv, yv, ph, xv_shift, yv_shift, cordic_angle, ww, pw, vectoring, mode):
+    """Rotates the vector (xv, yv) by the angle in the direction that drives
+    the phase, or y in the vectoring mode, towards zero. Called from the HLS
+    stages with the shifted x and y already at hand."""
+
+    # rotation mode drives the phase to zero, vectoring mode drives y to
+    # zero while accumulating the phase
+    if vectoring:
+        pol = yv >= 0
+    else:
+        pol = ph[-1]
+
+    # x is updated with the opposite sign in the hyperbolic mode, and not
+    # at all in the linear mode
+    xv_neg = code(xv + yv_shift, Int[ww])
+    xv_pos = code(xv - yv_shift, Int[ww])
+    if mode == CordicMode.HYPERBOLIC:
+        xv_neg, xv_pos = xv_pos, xv_neg
+    elif mode == CordicMode.LINEAR:
+        xv_neg, xv_pos = xv, xv
+
+    if pol:
+        xv_next = xv_neg
+        yv_next = code(yv - xv_shift, Int[ww])
+        ph_next = code(ph + cordic_angle, Uint[pw])
+    else:
+        xv_next = xv_pos
+        yv_next = code(yv + xv_shift, Int[ww])
+        ph_next = code(ph - cordic_angle, Uint[pw])
+
+    return (xv_next, yv_next, ph_next)
+
+
 @gear
-async def cordic_stage_hls(din, *, i, cordic_angle, ww, pw) -> b'din':
+async def cordic_stage_hls(din, *, i, cordic_angle, ww, pw, vectoring=False, mode=CordicMode.CIRCULAR) -> b'din':
     async with din as (xv, yv, ph):
-        if i + 1 < ww:
-            xv_shift = (xv >> (i + 1))
-            yv_shift = (yv >> (i + 1))
+        shift = cordic_shifts(i + 1, mode)[i]
+
+        if shift < ww:
+            xv_shift = (xv >> shift)
+            yv_shift = (yv >> shift)
         else:
             xv_shift = Uint[1](0)
             yv_shift = Uint[1](0)
 
-        pol = ph[-1]
+        yield cordic_micro_rotation(xv, yv, ph, xv_shift, yv_shift, cordic_angle, ww, pw, vectoring, mode)
 
-        if pol:
-            xv_next = code(xv + yv_shift, Int[ww])
-            yv_next = code(yv - xv_shift, Int[ww])
-            ph_next = code(ph + cordic_angle, Uint[pw])
+
+@gear
+async def cordic_stage_folded(din, *, ww, pw, vectoring=False, mode=CordicMode.CIRCULAR) -> b'din[0]':
+    """Same as cordic_stage_hls, but with the shifted x and y and the angle
+    received alongside the vector, so that it can perform any of the
+    stages."""
+
+    async with din as ((xv, yv, ph), xv_shift, yv_shift, cordic_angle):
+        yield cordic_micro_rotation(xv, yv, ph, xv_shift, yv_shift, cordic_angle, ww, pw, vectoring, mode)
+
+
+@gear
+def barrel_shift(din, shift, *, nshifts, left=False):
+    """Shifts din right, or left if left is set, by the value of shift, which
+    is below nshifts. Shifts by the din width or more give zero, as in
+    cordic_stage_hls, and the left shifts drop the bits above the din
+    width."""
+
+    t = din.dtype
+    shifted = [din]
+    for s in range(1, nshifts):
+        if s >= t.width:
+            shifted.append(t(0))
+        elif left:
+            shifted.append((din << s) >> t)
         else:
-            xv_next = code(xv - yv_shift, Int[ww])
-            yv_next = code(yv + xv_shift, Int[ww])
-            ph_next = code(ph - cordic_angle, Uint[pw])
+            shifted.append((din >> s) | t)
+
+    return field_sel(shift, ccat(*shifted))
+
 
-        yield (xv_next, yv_next, ph_next)
+@gear
+def leading_zeros(din: Uint) -> b'Uint[bitw(din.width)]':
+    """Counts the leading zero bits of din with a chain of multiplexers, one
+    per bit, where the higher set bits override the count of the lower ones.
+    Zero gives the din width."""
+
+    w = din.dtype.width
+    t = Uint[bitw(w)]
+
+    cnt = t(w)
+    for i in range(w):
+        cnt = field_sel(din[i], ccat(cnt, t(w - 1 - i)))
+
+    return cnt
+
+
+@gear
+async def cordic_folded_seq(din, v, *, nstages) -> \
+        b'(Tuple[Uint[bitw(nstages - 1)], din], din)':
+    """Passes each input vector through all the stages one after the other,
+    feeding the engine output v back as the input of the next stage."""
+
+    async with din as data:
+        state = data
+
+        for i in range(nstages):
+            yield (i, state), None
+
+            async with v as v_data:
+                state = v_data
+
+        yield None, state
+
+
+@gear
+def cordic_folded_engine(cmd, *, cordic_angles, nstages, ww, pw, vectoring=False, mode=CordicMode.CIRCULAR):
+    """Performs one micro-rotation per (stage, vector) command, with the stage
+    shift and angle read from ROM."""
+
+    shifts = cordic_shifts(nstages, mode)
+    t_step = Tuple[Uint[bitw(max(shifts))], Uint[pw]]
+    step = cmd[0] | rom(data=[t_step((shifts[i], cordic_angles[i])) for i in range(nstages)], dtype=t_step)
+
+    vec = cmd[1]
+    xv_shift = barrel_shift(vec[0], step[0], nshifts=max(shifts) + 1)
+    yv_shift = barrel_shift(vec[1], step[0], nshifts=max(shifts) + 1)
+
+    return ccat(vec, xv_shift, yv_shift, step[1]) | cordic_stage_folded(ww=ww, pw=pw, vectoring=vectoring, mode=mode)
+
+
+# clock cycles cordic_stages_folded spends on each stage
+CORDIC_FOLDED_STAGE_CYCLES = 2
+
+
+def cordic_folded_cycles(nstages):
+    """Returns the number of clock cycles cordic_stages_folded spends on each
+    input vector, including one cycle to pass the vector on."""
+
+    return nstages * CORDIC_FOLDED_STAGE_CYCLES + 1
+
+
+def cordic_folded_throughput(iw, ow, pw=None, nxtra=None, mode=CordicMode.CIRCULAR):
+    """Returns the throughput of the folded CORDIC in results per clock
+    cycle, for the parameters as given to cordic_params."""
+
+    nstages = cordic_params(iw=iw, ow=ow, nxtra=nxtra, pw=pw, mode=mode)[2]
+    return 1 / cordic_folded_cycles(nstages)
+
+
+@gear
+def cordic_stages_folded(din, *, cordic_angles, nstages, ww, pw, vectoring=False, mode=CordicMode.CIRCULAR):
+    """Same as cordic_stages, but with all the stages time-multiplexed onto a
+    single micro-rotation datapath, see cordic_folded_engine. Accepts a new
+    vector every cordic_folded_cycles(nstages) clock cycles."""
+
+    v = Intf(din.dtype)
+    cmd, dout = cordic_folded_seq(din, v | decouple, nstages=nstages)
+    v |= cmd | cordic_folded_engine(
+        cordic_angles=cordic_angles, nstages=nstages, ww=ww, pw=pw, vectoring=vectoring, mode=mode)
+
+    return dout
 
 
 @gear
@@ -192,6 +425,89 @@ def cordic_first_stage(i_xval, i_yval, i_phase, *, iw, ww, pw):
     return ccat(xv_0, yv_0, ph_0) | dreg
 
 
+@gear
+def cordic_vectoring_first_stage(din, *, iw, ww, pw):
+    """Rotates the vector by a multiple of 90 degrees, so that it lies within
+    +/-45 degrees, where the vectoring stages converge. Phase is initialized
+    with the rotation angle."""
+
+    i_xval, i_yval = din[0], din[1]
+
+    # extend the values the same way as cordic_first_stage
+    e_xval = ccat(Uint[ww - iw - 1](0), i_xval, i_xval[-1]) >> Int[ww]
+    e_yval = ccat(Uint[ww - iw - 1](0), i_yval, i_yval[-1]) >> Int[ww]
+    n_e_xval = -e_xval >> Int[ww]
+    n_e_yval = -e_yval >> Int[ww]
+
+    abs_xval = field_sel(i_xval[-1], ccat(i_xval | Int[iw + 1], -i_xval))
+    abs_yval = field_sel(i_yval[-1], ccat(i_yval | Int[iw + 1], -i_yval))
+
+    # rotations by 0, 180, 90 and 270 degrees, chosen by the larger
+    # coordinate and its sign
+    y_major = abs_yval > abs_xval
+    phase_ctrl = ccat(field_sel(y_major, ccat(i_xval[-1], i_yval <= 0)), y_major) >> Uint[2]
+
+    xv_0 = field_sel(phase_ctrl, ccat(e_xval, n_e_xval, e_yval, n_e_yval))
+    yv_0 = field_sel(phase_ctrl, ccat(e_yval, n_e_yval, n_e_xval, e_xval))
+    ph_0 = field_sel(
+        phase_ctrl,
+        ccat(Uint[pw](0), Uint[pw](2**pw // 2), Uint[pw](2**pw // 4), Uint[pw]((2**pw // 2) + (2**pw // 4))))
+
+    return ccat(xv_0, yv_0, ph_0)
+
+
+@gear
+def cordic_vectoring(i_xval: Int['iw'],
+                     i_yval: Int['iw'],
+                     *,
+                     ow=12,
+                     iw=b'iw',
+                     pw=None,
+                     norm_gain=True,
+                     stages_per_reg=1):
+    """
+    CORDIC in vectoring mode, converts the vector (i_xval, i_yval) to the polar
+    coordinates. Returns the magnitude, scaled the same way as the cordic
+    outputs, and the phase as Uint[pw] where 2**pw corresponds to 2*pi.
+    Processes one vector per clock cycle.
+
+    Parameters
+    ----------
+    pw : int
+        Phase width, calculated from iw and ow if omitted.
+
+    norm_gain : bool
+        Whether to remove the CORDIC gain from the magnitude.
+
+    stages_per_reg : int
+        Number of stages between the pipeline registers, see cordic_stages.
+    """
+
+    pw, ww, nstages, cordic_angles_l, gain = cordic_params(iw=iw, ow=ow, pw=pw)
+    cordic_angles = []
+    for val in cordic_angles_l:
+        cordic_angles.append(Uint[pw](val))
+
+    first_stage = ccat(i_xval, i_yval) \
+        | cordic_vectoring_first_stage(iw=iw, ww=ww, pw=pw) \
+        | dreg
+
+    last_stage = cordic_stages(first_stage,
+                               nstages=nstages,
+                               cordic_angles=cordic_angles,
+                               pw=pw,
+                               ww=ww,
+                               vectoring=True,
+                               stages_per_reg=stages_per_reg)
+
+    mag_out = (last_stage[0] | round_to_even(nbits=ww - ow)) >> (ww - ow)
+
+    if norm_gain is True:
+        mag_out = ((mag_out * gain) >> 32) | mag_out.dtype
+
+    return ccat(mag_out | dreg, last_stage[2] | dreg)
+
+
 @gear
 def cordic(i_xval: Int['iw'],
            i_yval: Int['iw'],
@@ -201,13 +517,33 @@ def cordic(i_xval: Int['iw'],
            iw=b'iw',
            pw=b'pw',
            norm_gain_sin=True,
-           norm_gain_cos=False):
+           norm_gain_cos=False,
+           stages_per_reg=None,
+           folded=False):
+    """
+    CORDIC in rotation mode, rotates the vector (i_xval, i_yval) by i_phase,
+    where 2**pw corresponds to 2*pi. Returns the rotated y and x.
 
-    pw, ww, nstages, cordic_angles_l, gain = cordic_params(iw=iw, ow=ow, pw=pw)
-    cordic_angles = []
-    for val in cordic_angles_l:
-        cordic_angles.append(Uint[pw](val))
+    Parameters
+    ----------
+    stages_per_reg : int
+        Number of stages between the pipeline registers, see cordic_stages.
+        If omitted, every stage is registered. Does not apply to the folded
+        CORDIC, which registers every micro-rotation.
+
+    folded : bool
+        Whether to perform all the stages on a single micro-rotation datapath,
+        see cordic_stages_folded. Throughput is then reduced to
+        cordic_folded_throughput results per clock cycle.
+    """
+
+    if folded and stages_per_reg is not None:
+        raise ValueError("stages_per_reg does not apply to the folded CORDIC")
+
+    if stages_per_reg is None:
+        stages_per_reg = 1
 
+    pw, ww, nstages, cordic_angles_l, gain = cordic_params(iw=iw, ow=ow, pw=pw)
     cordic_angles = []
     for val in cordic_angles_l:
         cordic_angles.append(Uint[pw](val))
@@ -219,11 +555,31 @@ def cordic(i_xval: Int['iw'],
                                      ww=ww,
                                      pw=pw)
 
-    last_stage = cordic_stages(first_stage,
-                               nstages=nstages,
-                               cordic_angles=cordic_angles,
-                               pw=pw,
-                               ww=ww)
+    if folded:
+        last_stage = cordic_stages_folded(first_stage,
+                                          nstages=nstages,
+                                          cordic_angles=cordic_angles,
+                                          pw=pw,
+                                          ww=ww)
+    else:
+        last_stage = cordic_stages(first_stage,
+                                   nstages=nstages,
+                                   cordic_angles=cordic_angles,
+                                   pw=pw,
+                                   ww=ww,
+                                   stages_per_reg=stages_per_reg)
+
+    return cordic_out(last_stage,
+                      ow=ow,
+                      ww=ww,
+                      gain=gain,
+                      norm_gain_sin=norm_gain_sin,
+                      norm_gain_cos=norm_gain_cos)
+
+
+def cordic_out(last_stage, *, ow, ww, gain, norm_gain_sin, norm_gain_cos):
+    """Rounds the x and y of the last stage to ow bits, optionally removes the
+    CORDIC gain, and returns them registered as the rotated y and x."""
 
     xv_out = (last_stage[0] | round_to_even(nbits=ww - ow)) >> (ww - ow)
     yv_out = (last_stage[1] | round_to_even(nbits=ww - ow)) >> (ww - ow)
@@ -236,6 +592,55 @@ def cordic(i_xval: Int['iw'],
     return ccat(yv_out | dreg, xv_out | dreg)
 
 
+@gear
+def cordic_lanes(din: Array[Tuple[Int['iw'], Int['iw'], Uint['pw']], 'lanes'],
+                 *,
+                 ow=12,
+                 iw=b'iw',
+                 pw=b'pw',
+                 norm_gain_sin=True,
+                 norm_gain_cos=False,
+                 stages_per_reg=1):
+    """
+    CORDIC in rotation mode for the array of lanes, rotates the vector (x, y)
+    of each lane by its phase, where 2**pw corresponds to 2*pi. Returns the
+    array of the rotated (y, x) pairs. All the lanes are transferred in a
+    single handshake and advance through the identical pipelines together, so
+    that the throughput grows linearly with the number of lanes. CORDIC
+    parameters are calculated once and the angle constants are shared by all
+    the lanes.
+
+    Parameters
+    ----------
+    stages_per_reg : int
+        Number of stages between the pipeline registers, see cordic_stages.
+    """
+
+    pw, ww, nstages, cordic_angles_l, gain = cordic_params(iw=iw, ow=ow, pw=pw)
+    cordic_angles = [Uint[pw](val) for val in cordic_angles_l]
+
+    outs = []
+    for i in range(len(din.dtype)):
+        first_stage = cordic_first_stage(din[i][0], din[i][1], din[i][2], iw=iw, ww=ww, pw=pw)
+
+        last_stage = cordic_stages(first_stage,
+                                   nstages=nstages,
+                                   cordic_angles=cordic_angles,
+                                   pw=pw,
+                                   ww=ww,
+                                   stages_per_reg=stages_per_reg)
+
+        outs.append(
+            cordic_out(last_stage,
+                       ow=ow,
+                       ww=ww,
+                       gain=gain,
+                       norm_gain_sin=norm_gain_sin,
+                       norm_gain_cos=norm_gain_cos))
+
+    return ccat(*outs) | Array
+
+
 @gear
 def cordic_sin_cos(phase: Uint['pw'],
                    *,
@@ -243,16 +648,418 @@ def cordic_sin_cos(phase: Uint['pw'],
                    pw=b'pw',
                    iw=12,
                    norm_gain_sin=False,
-                   norm_gain_cos=False):
+                   norm_gain_cos=False,
+                   stages_per_reg=None,
+                   folded=False):
 
     sin_cos = cordic(Int[iw]((2**iw - 1) - (2**(iw - 1))),
                      Int[iw](0),
                      phase,
                      ow=ow,
                      norm_gain_sin=norm_gain_sin,
-                     norm_gain_cos=norm_gain_cos)
+                     norm_gain_cos=norm_gain_cos,
+                     stages_per_reg=stages_per_reg,
+                     folded=folded)
 
     sin = sin_cos[0]
     cos = sin_cos[1]
 
     return sin, cos
+
+
+def cordic_lut_start(cordic_angles, rw):
+    """Returns the first stage needed to rotate by the residual phases up to
+    2**(rw - 1), i.e. the stages before it are replaced by the LUT."""
+
+    start = 0
+    while start + 1 < len(cordic_angles) and sum(cordic_angles[start + 1:]) >= 2**(rw - 1):
+        start += 1
+
+    return start
+
+
+def cordic_lut(lut_bits, amplitude):
+    """Returns the quarter-wave sine LUT sampled in the middle of each of the
+    2**lut_bits steps. Cosine is read from the same LUT at the inverted
+    address."""
+
+    step = math.pi / 2 / 2**lut_bits
+    return [round(amplitude * math.sin((k + 0.5) * step)) for k in range(2**lut_bits)]
+
+
+@gear
+async def cordic_lut_first_stage(phase, *, lut, ww, pw, rw) -> b'Tuple[Int[ww], Int[ww], Uint[pw]]':
+    """Reads the coarse vector from the quarter-wave LUT and rotates it into
+    the quadrant of the phase. Phase residual is measured from the middle of
+    the LUT step, so that it is at most half the step in both directions."""
+
+    half = Uint[rw](1 << (rw - 1))
+
+    async with phase as ph:
+        quad = ph[pw - 2:]
+        coarse = ph[rw:pw - 2]
+        res = code(Int[pw](ph[:rw] - half), Uint[pw])
+
+        sin_c = lut[coarse]
+        cos_c = lut[~coarse]
+
+        if quad == 0:
+            yield (cos_c, sin_c, res)
+        elif quad == 1:
+            yield (code(-sin_c, Int[ww]), cos_c, res)
+        elif quad == 2:
+            yield (code(-cos_c, Int[ww]), code(-sin_c, Int[ww]), res)
+        else:
+            yield (sin_c, code(-cos_c, Int[ww]), res)
+
+
+@gear
+def cordic_sin_cos_lut(phase: Uint['pw'], *, ow, pw=b'pw', lut_bits=6, nxtra=4, stages_per_reg=1):
+    """
+    Computes sine and cosine of the phase, where 2**pw corresponds to 2*pi.
+    Two phase MSBs select the quadrant and the next lut_bits address the
+    quarter-wave LUT, so that the CORDIC only rotates by the remaining phase.
+    That leaves out about lut_bits of the first stages of cordic_sin_cos.
+    Outputs are of the full scale of Int[ow], with the CORDIC gain removed
+    through the LUT. Processes one phase per clock cycle.
+
+    Parameters
+    ----------
+    lut_bits : int
+        Address width of the quarter-wave LUT.
+
+    nxtra : int
+        Extra bits of the CORDIC stages, see cordic_params.
+
+    stages_per_reg : int
+        Number of stages between the pipeline registers, see cordic_stages.
+    """
+
+    pw, ww, nstages, cordic_angles_l, gain = cordic_params(iw=ow, ow=ow, nxtra=nxtra, pw=pw)
+    cordic_angles = [Uint[pw](val) for val in cordic_angles_l]
+
+    rw = pw - 2 - lut_bits
+    if rw < 1:
+        raise ValueError(f"LUT of {lut_bits} bits needs the phase wider than {lut_bits + 2} bits, got {pw}")
+
+    start = cordic_lut_start(cordic_angles_l, rw)
+
+    # LUT is scaled down by the gain of the remaining stages
+    stage_gain = 1
+    for i in range(start, nstages):
+        stage_gain *= math.sqrt(1 + math.pow(2, -2 * (i + 1)))
+
+    lut = cordic_lut(lut_bits, (2**(ow - 1) - 1) * 2**(ww - ow) / stage_gain)
+    lut = Array[Int[ww], len(lut)](lut)
+
+    first_stage = phase | cordic_lut_first_stage(lut=lut, ww=ww, pw=pw, rw=rw) | dreg
+
+    last_stage = cordic_stages(first_stage,
+                               nstages=nstages,
+                               cordic_angles=cordic_angles,
+                               pw=pw,
+                               ww=ww,
+                               stages_per_reg=stages_per_reg,
+                               start=start)
+
+    # full scale outputs can round up out of range
+    half = Int[ww - ow + 1](2**(ww - ow - 1))
+    xv_out = ((last_stage[0] + half) >> (ww - ow)) | saturate(t=Int[ow])
+    yv_out = ((last_stage[1] + half) >> (ww - ow)) | saturate(t=Int[ow])
+
+    return yv_out | dreg, xv_out | dreg
+
+
+def shift_round(val, shift):
+    """Shifts the integer val right by shift bits rounding half up, or left if
+    the shift is negative. Works both on the integers and on the interfaces
+    of the integer types."""
+
+    if shift <= 0:
+        return val << -shift
+
+    return (val + (1 << (shift - 1))) >> shift
+
+
+# Arithmetic functions keep x and y as the fixed point numbers with the sign
+# and two integer bits, i.e. with ww - 3 fraction bits, while the phase has
+# two integer bits and pw - 2 fraction bits. The inputs are normalized by the
+# first stage into the range where the CORDIC converges, and the last stage
+# undoes the normalization. Extra bits cover the rounding errors accumulated
+# over the stages.
+CORDIC_FN_NXTRA = 8
+
+
+@gear
+def cordic_sqrt_first_stage(din, *, ww, pw):
+    """Normalizes din to m * 4**e with m in [1/4, 1), and initializes the
+    vector to (m + 1/4, m - 1/4), whose hyperbolic magnitude is sqrt(m). The
+    exponent is passed on as r = e_max - e, for the largest exponent e_max of
+    the din type. Zero gives the zero vector."""
+
+    w = din.dtype.width
+    odd = din.dtype.integer % 2
+    fract = ww - 3
+
+    val = din >> Uint[w]
+    lz = leading_zeros(val)
+    norm = barrel_shift(val, lz, nshifts=w + 1, left=True)
+
+    # m has w + 1 fraction bits, and is halved for the odd exponents
+    m_even = norm << 1
+    m_odd = norm | Uint[w + 1]
+    if odd:
+        m = field_sel(lz[0], ccat(m_odd, m_even))
+    else:
+        m = field_sel(lz[0], ccat(m_even, m_odd))
+
+    m = shift_round(m, w + 1 - fract)
+    quarter = 1 << (fract - 2)
+
+    zero = val == 0
+    xv = field_sel(zero, ccat((m + quarter) | Int[ww], Int[ww](0)))
+    yv = field_sel(zero, ccat((m - quarter) | Int[ww], Int[ww](0)))
+
+    if odd:
+        lz = lz + 1
+    r = (lz >> 1) >> Uint[bitw((w + odd) // 2)]
+
+    return ccat(xv, yv, Uint[pw](0), r)
+
+
+@gear
+def cordic_sqrt_last_stage(din, *, ww, gain, nshifts, t):
+    # remove the hyperbolic gain and scale by 2**e = 2**(e_max - r)
+    val = barrel_shift(din[0] * gain, din[3], nshifts=nshifts)
+    val = shift_round(val, 32 + (ww - 3) - t.integer - t.fract)
+
+    return (val | saturate(t=Uint[t.width])) >> t
+
+
+@gear
+def cordic_sqrt(din, *, ow=12, stages_per_reg=1):
+    """
+    Square root of the unsigned fixed point din, computed by the hyperbolic
+    CORDIC in vectoring mode. Output is of the type Ufixp[ceil(i/2), ow] for
+    the input integer width i. Processes one sample per clock cycle.
+    """
+
+    t = Ufixp[(din.dtype.integer + 1) // 2, ow]
+    nshifts = (din.dtype.width + din.dtype.integer % 2) // 2 + 1
+
+    pw, ww, nstages, cordic_angles_l, gain = cordic_params(iw=ow, ow=ow, nxtra=CORDIC_FN_NXTRA, mode=CordicMode.HYPERBOLIC)
+    cordic_angles = [Uint[pw](val) for val in cordic_angles_l]
+
+    first_stage = din | cordic_sqrt_first_stage(ww=ww, pw=pw) | dreg
+
+    last_stage = cordic_stages(first_stage,
+                               nstages=nstages,
+                               cordic_angles=cordic_angles,
+                               pw=pw,
+                               ww=ww,
+                               vectoring=True,
+                               mode=CordicMode.HYPERBOLIC,
+                               stages_per_reg=stages_per_reg)
+
+    return last_stage | cordic_sqrt_last_stage(ww=ww, gain=gain, nshifts=nshifts, t=t) | dreg
+
+
+@gear
+def cordic_ln_first_stage(din, *, ww, pw):
+    """Normalizes din to m * 2**e with m in [1/2, 1), and initializes the
+    vector to (m + 1, m - 1), for which the vectoring accumulates ln(m)/2. The
+    exponent is passed on as the leading zero count of din."""
+
+    w = din.dtype.width
+    fract = ww - 3
+
+    # zero is replaced by the smallest positive input
+    val = din >> Uint[w]
+    val = field_sel(val == 0, ccat(val, Uint[w](1)))
+
+    lz = leading_zeros(val)
+    m = shift_round(barrel_shift(val, lz, nshifts=w, left=True), w - fract)
+    one = 1 << fract
+
+    return ccat((m + one) | Int[ww], (m - one) | Int[ww], Uint[pw](0), lz)
+
+
+@gear
+def cordic_ln_last_stage(din, *, pw, integer, t):
+    ln2 = round(math.log(2) * 2**(pw - 2))
+
+    # exponent is the din integer width less the leading zeros
+    val = ((din[2] >> Int[pw]) << 1) - din[3] * ln2
+    if integer:
+        val = val + integer * ln2
+
+    val = shift_round(val, pw - 2 - t.fract)
+
+    return (val | saturate(t=Int[t.width])) >> t
+
+
+@gear
+def cordic_ln(din, *, ow=12, stages_per_reg=1):
+    """
+    Natural logarithm of the unsigned fixed point din, computed by the
+    hyperbolic CORDIC in vectoring mode. Output is a Fixp of the width ow, with
+    the integer part wide enough for the logarithm of any din. Zero input
+    gives the logarithm of the input LSB. Processes one sample per clock cycle.
+    """
+
+    fract = din.dtype.fract
+    integer = din.dtype.integer
+
+    # logarithm magnitude is the largest for the LSB or the full scale input
+    ln_max = max(fract, integer, 1) * math.log(2)
+    t = Fixp[math.floor(math.log2(ln_max)) + 2, ow]
+
+    pw, ww, nstages, cordic_angles_l, gain = cordic_params(iw=ow, ow=ow, nxtra=CORDIC_FN_NXTRA, mode=CordicMode.HYPERBOLIC)
+    cordic_angles = [Uint[pw](val) for val in cordic_angles_l]
+
+    first_stage = din | cordic_ln_first_stage(ww=ww, pw=pw) | dreg
+
+    last_stage = cordic_stages(first_stage,
+                               nstages=nstages,
+                               cordic_angles=cordic_angles,
+                               pw=pw,
+                               ww=ww,
+                               vectoring=True,
+                               mode=CordicMode.HYPERBOLIC,
+                               stages_per_reg=stages_per_reg)
+
+    return last_stage | cordic_ln_last_stage(pw=pw, integer=integer, t=t) | dreg
+
+
+def cordic_exp_quotient(val, fract, pw):
+    """Returns round(v / ln(2)) for the value v of the code val with fract
+    fraction bits, for the integers as well as for the interfaces."""
+
+    return shift_round(val * round(2**pw / math.log(2)), fract + pw)
+
+
+@gear
+def cordic_exp_first_stage(din, *, ww, pw, gain, qmin, nshifts):
+    """Splits din to q*ln(2) + r with the integer q and |r| <= ln(2)/2, and
+    initializes the vector to (1/K, 0) with the phase r, for the hyperbolic
+    CORDIC gain K. The exponent is passed on as q - qmin, for the smallest q
+    of the din type."""
+
+    ln2 = round(math.log(2) * 2**(pw - 2))
+    fract = din.dtype.fract
+
+    val = din >> Int[din.dtype.width]
+    q = cordic_exp_quotient(val, fract, pw)
+    r = shift_round(val, fract - (pw - 2)) - q * ln2
+
+    return ccat(Int[ww](shift_round(gain, 32 - (ww - 3))), Int[ww](0), r >> Uint[pw],
+                (q - qmin) >> Uint[bitw(nshifts - 1)])
+
+
+@gear
+def cordic_exp_last_stage(din, *, ww, qmin, nshifts, t):
+    # exp(r) = cosh(r) + sinh(r), scaled by 2**q = 2**(qmin + din[3])
+    val = (din[0] + din[1]) | Int[ww + nshifts]
+    val = barrel_shift(val, din[3], nshifts=nshifts, left=True)
+    val = shift_round(val, (ww - 3) - qmin - t.fract)
+
+    return (val | saturate(t=Uint[t.width])) >> t
+
+
+@gear
+def cordic_exp(din, *, ow=12, stages_per_reg=1):
+    """
+    Exponential function of the signed fixed point din, computed by the
+    hyperbolic CORDIC in rotation mode. Output is of the type Ufixp[io, ow],
+    with the integer part io wide enough for the exponential of any din.
+    Processes one sample per clock cycle.
+    """
+
+    w = din.dtype.width
+    fract = din.dtype.fract
+
+    # largest din is just below 2**(integer-1)
+    t = Ufixp[math.floor(2**(din.dtype.integer - 1) * math.log2(math.e)) + 1, ow]
+
+    pw, ww, nstages, cordic_angles_l, gain = cordic_params(iw=ow, ow=ow, nxtra=CORDIC_FN_NXTRA, mode=CordicMode.HYPERBOLIC)
+    cordic_angles = [Uint[pw](val) for val in cordic_angles_l]
+
+    qmin = cordic_exp_quotient(-2**(w - 1), fract, pw)
+    nshifts = cordic_exp_quotient(2**(w - 1) - 1, fract, pw) - qmin + 1
+
+    first_stage = din | cordic_exp_first_stage(ww=ww, pw=pw, gain=gain, qmin=qmin, nshifts=nshifts) | dreg
+
+    last_stage = cordic_stages(first_stage,
+                               nstages=nstages,
+                               cordic_angles=cordic_angles,
+                               pw=pw,
+                               ww=ww,
+                               mode=CordicMode.HYPERBOLIC,
+                               stages_per_reg=stages_per_reg)
+
+    return last_stage | cordic_exp_last_stage(ww=ww, qmin=qmin, nshifts=nshifts, t=t) | dreg
+
+
+@gear
+def cordic_div_first_stage(din, *, ww, pw):
+    """Shifts num and den so that |den| fills ww - 2 bits, since the quotient
+    does not depend on the scale, and negates both if den is negative, since
+    the linear vectoring converges only for the positive x. Passes on whether
+    den is zero alongside the sign of num, as the index of the quotient
+    limit to saturate to."""
+
+    num, den = din[0], din[1]
+    iw = num.dtype.width
+
+    neg = den[-1]
+    num_abs = field_sel(neg, ccat(num | Int[iw + 1], -num))
+    den_abs = field_sel(neg, ccat(den | Int[iw + 1], -den)) >> Uint[iw]
+
+    lz = leading_zeros(den_abs)
+    xv = barrel_shift((den_abs << (ww - 2 - iw)) | Int[ww], lz, nshifts=iw + 1, left=True)
+    yv = barrel_shift((num_abs << (ww - 2 - iw)) | Int[ww], lz, nshifts=iw + 1, left=True)
+
+    sat = ccat(num[-1], den_abs == 0) >> Uint[2]
+
+    return ccat(xv, yv, Uint[pw](0), sat)
+
+
+@gear
+def cordic_div_last_stage(din, *, pw, t):
+    val = shift_round(din[2] >> Int[pw], pw - 2 - t.fract)
+    val = (val | saturate(t=Int[t.width])) >> t
+
+    return field_sel(din[3], ccat(val, val, t.max, t.min))
+
+
+@gear
+def cordic_div(num, den, *, ow=12, stages_per_reg=1):
+    """
+    Divides num by den of the same type, using the linear CORDIC in vectoring
+    mode. Quotient is of the type Fixp[2, ow], and is valid for
+    |num| < 2*|den|. Division by zero saturates the quotient to the limit of
+    the num sign, with 0/0 giving the largest quotient. Processes one sample
+    per clock cycle.
+    """
+
+    if num.dtype != den.dtype:
+        raise ValueError(f"Dividend type {num.dtype} differs from the divisor type {den.dtype}")
+
+    iw = num.dtype.width
+    t = Fixp[2, ow]
+
+    pw, ww, nstages, cordic_angles_l, gain = cordic_params(iw=iw, ow=ow, nxtra=CORDIC_FN_NXTRA, mode=CordicMode.LINEAR)
+    cordic_angles = [Uint[pw](val) for val in cordic_angles_l]
+
+    first_stage = ccat(num, den) | cordic_div_first_stage(ww=ww, pw=pw) | dreg
+
+    last_stage = cordic_stages(first_stage,
+                               nstages=nstages,
+                               cordic_angles=cordic_angles,
+                               pw=pw,
+                               ww=ww,
+                               vectoring=True,
+                               mode=CordicMode.LINEAR,
+                               stages_per_reg=stages_per_reg)
+
+    return last_stage | cordic_div_last_stage(pw=pw, t=t) | dreg
@@ -1,35 +1,103 @@
-from pygears import gear
-from pygears.lib import dreg, qround, saturate
+import math
+from enum import IntEnum
+
+import numpy as np
+
+from pygears import Intf, gear
+from pygears.typing import Array, Fixp, Queue, Tuple, Uint, bitw, code
+from pygears.typing.math import ceil_div
+from pygears.lib import (accum, ccat, decouple, dreg, parallelize, pipeline, project, qround, queuemap, saturate,
+                         sdp, serialize, field_sel)
+from pygears_dsp.lib.basic_blocks import add_sub_dsp, coef_bound, coef_sync, fixp_bound, mult_dsp, prune, rom_sdp
+from pygears_dsp.lib.fft_bf import FFT_recursive, format_fixp
+from pygears_dsp.lib.mcm import mcm
+
+
+class AdderStructure(IntEnum):
+    CHAIN = 0
+    TREE = 1
 
 
 @gear
-def fir_direct(din, *, b):
+def fir_direct_sum(din, *, b, prune_sum=False):
+
+    # zero taps add nothing, and the trailing ones need no delays
+    taps = [i for i, b_coef in enumerate(b) if float(b_coef) != 0]
+    if not taps:
+        raise ValueError("All coefficients b are zero")
 
     # init delayed input and output sum
     x = din
+    y_sum = None
+
+    # construct filter structure for all fir coefficients
+    for i, b_coef in enumerate(b[:taps[-1] + 1]):
+
+        # add delay
+        if i > 0:
+            x = x | dreg(init=0)
+
+        if i not in taps:
+            continue
+
+        # summation
+        if y_sum is None:
+            y_sum = x * b_coef
+            continue
+
+        y_sum = y_sum + (x * b_coef)
+
+        # remove sum bits that cannot be reached with the coefficients
+        if prune_sum:
+            y_sum = y_sum | prune(bound=fixp_bound(din.dtype) * coef_bound(b[:i + 1]))
+
+    # full precision sum
+    return y_sum
+
+
+@gear
+def fir_direct(din, *, b, prune_sum=False):
+
+    # filter at full precision
+    y_sum = din | fir_direct_sum(b=b, prune_sum=prune_sum)
+
+    # format sum as input
+    return y_sum | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
+
+
+@gear
+def fir_direct_cfg(din, cfg: Array, *, init=None):
+    """Direct form FIR with coefficients reloadable at runtime through the cfg
+    interface, one ``Array`` of coefficients per reload. New coefficients are
+    applied starting with the next input sample, see ``coef_sync``."""
+
+    # pair samples with the active coefficients
+    x, b = coef_sync(din, cfg, init=init)
+
+    # init output sum
     y_sum = x * b[0]
 
     # construct filter structure for all fir coefficients
-    for b_coef in b[1:]:
+    for i in range(1, len(cfg.dtype)):
 
         # add delay
         x = x | dreg(init=0)
 
         # summation
-        y_sum = y_sum + (x * b_coef)
+        y_sum = y_sum + (x * b[i])
 
     # format sum as input
     return y_sum | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
 
 
 @gear
-def fir_transposed(din, *, b):
+def fir_transposed(din, *, b, prune_sum=False):
 
     # init output sum
     y_sum = din * b[0]
 
     # construct filter structure for all fir coefficients
-    for b_coef in b[1:]:
+    for i, b_coef in enumerate(b[1:], 2):
 
         # multiply input with b coefficient
         mult_b_result = din * b_coef
@@ -40,5 +108,606 @@ def fir_transposed(din, *, b):
         # add to output sum
         y_sum = mult_b_result + delayed_y_sum
 
+        # remove sum bits that cannot be reached with the coefficients
+        if prune_sum:
+            y_sum = y_sum | prune(bound=fixp_bound(din.dtype) * coef_bound(b[:i]))
+
+    # format sum as input
+    return y_sum | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
+
+
+@gear
+def fir_multiplierless(din, *, b):
+    """Transposed FIR where the input is multiplied with all the coefficients
+    using shifts and adders only. Coefficients are recoded in canonical signed
+    digits and share common subexpressions, see ``mcm_report`` for the number
+    of adders used per coefficient."""
+
+    # products with coefficient magnitudes
+    prods = mcm(din, b)
+
+    # construct filter structure for all fir coefficients
+    y_sum = None
+    for b_coef, mult_b_result in zip(b, prods):
+
+        # delay output sum
+        if y_sum is not None:
+            y_sum = y_sum | dreg(init=0)
+
+        # zero coefficients add nothing
+        if mult_b_result is None:
+            continue
+
+        # add to output sum, coefficient sign decides between addition and subtraction
+        if y_sum is None:
+            y_sum = -mult_b_result if int(b_coef) < 0 else mult_b_result
+        elif int(b_coef) < 0:
+            y_sum = y_sum - mult_b_result
+        else:
+            y_sum = y_sum + mult_b_result
+
+    if y_sum is None:
+        raise ValueError("All coefficients b are zero")
+
+    # with trailing zero coefficients, keep one output per input sample
+    if prods[-1] is None:
+        y_sum = ccat(y_sum, din)[0]
+
+    # format sum as input
+    return y_sum | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
+
+
+def symmetric_check(b):
+    """Raises ValueError if coefficients ``b`` are not symmetric."""
+
+    n = len(b)
+    for i in range(n // 2):
+        if float(b[i]) != float(b[n - 1 - i]):
+            raise ValueError(
+                f"Coefficients b are not symmetric, b[{i}]={float(b[i])} != b[{n - 1 - i}]={float(b[n - 1 - i])}")
+
+
+def symmetric_delay_line(din, b):
+    """Delay line for ``symmetric_sum``, ending with the last sample that is
+    multiplied with a non-zero coefficient."""
+
+    n = len(b)
+    skip = 0
+    while skip < n // 2 and float(b[skip]) == 0:
+        skip += 1
+
+    x = [din]
+    for i in range(1, n - skip):
+        x.append(x[-1] | dreg(init=0))
+
+    return x
+
+
+def symmetric_sum(x, b):
+    """Full precision sum of the symmetric coefficients ``b`` multiplied with
+    the delay line ``x``. Mirrored delay line samples are added before the
+    multiplication, and the coefficient pairs equal to zero are skipped."""
+
+    n = len(b)
+
+    # center tap of odd length filters has no pair
+    if n % 2 and float(b[n // 2]) != 0:
+        y_sum = x[n // 2] * b[n // 2]
+    else:
+        y_sum = None
+
+    # pre-add mirrored samples and multiply once per coefficient pair
+    for i in range(n // 2):
+        if float(b[i]) == 0:
+            continue
+
+        x_pair = x[i] + x[n - 1 - i]
+        mult_b_result = x_pair * b[i]
+        y_sum = mult_b_result if y_sum is None else y_sum + mult_b_result
+
+    # sync output with the delay line input if it was skipped
+    if float(b[0]) == 0:
+        y_sum = ccat(y_sum, x[0])[0]
+
+    return y_sum
+
+
+@gear
+def fir_symmetric(din, *, b):
+    """Linear-phase FIR for symmetric coefficients ``b``. Mirrored delay line
+    samples are added before the multiplication, so only one multiplier per
+    coefficient pair is needed."""
+
+    symmetric_check(b)
+
+    # init delay line
+    x = symmetric_delay_line(din, b)
+
+    # format sum as input
+    return symmetric_sum(x, b) | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
+
+
+@gear
+def fir_halfband(din, *, b, decimate=False):
+    """
+    Half-band FIR for odd length symmetric coefficients ``b``, where every
+    other coefficient, apart from the center one, equals zero. Zero taps are
+    skipped, mirrored taps are folded as in ``fir_symmetric``, and the center
+    tap equal to 0.5 is implemented as a shift, so only about a quarter of the
+    ``fir_direct`` multipliers is needed.
+
+    With ``decimate`` set, only every second output is computed, matching
+    ``signal.upfirdn(b, x, down=2)``. Both polyphase branches then run at the
+    half of the input rate, one holding all the non-zero side taps and the
+    other only the center tap.
+    """
+
+    n = len(b)
+    c = n // 2
+
+    if n % 2 == 0:
+        raise ValueError(f"Half-band filter needs an odd number of coefficients, got {n}")
+
+    symmetric_check(b)
+
+    for i in range(c % 2, n, 2):
+        if i != c and float(b[i]) != 0:
+            raise ValueError(f"Coefficients b are not half-band, b[{i}]={float(b[i])} != 0")
+
+    # center tap is implemented separately
+    b_side = list(b)
+    b_side[c] = type(b[c])(0)
+
+    def center_tap(x_center):
+        if float(b[c]) == 0.5:
+            return x_center >> 1
+        else:
+            return x_center * b[c]
+
+    if not decimate:
+        # init delay line
+        x = symmetric_delay_line(din, b_side)
+
+        y_sum = symmetric_sum(x, b_side) + center_tap(x[c])
+    else:
+        # gather 2 consecutive input samples per transaction
+        x = din | parallelize(t=Array[din.dtype, 2])
+
+        # phase p processes samples x[2*n - p]
+        x_phases = [x[0], x[1] | dreg(init=0)]
+
+        # side taps are all in one phase, symmetric on their own
+        b_side = b_side[1 - c % 2::2]
+        x_side = symmetric_delay_line(x_phases[1 - c % 2], b_side)
+
+        # center tap is the only tap of the other phase
+        x_center = x_phases[c % 2]
+        for i in range(c // 2):
+            x_center = x_center | dreg(init=0)
+
+        y_sum = symmetric_sum(x_side, b_side) + center_tap(x_center)
+
+        # sync output with the input, since both phases can be delayed
+        y_sum = ccat(y_sum, x)[0]
+
     # format sum as input
     return y_sum | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
+
+
+def adder_tree(din, *, latency):
+    """Sums the list of interfaces ``din`` using a balanced tree of
+    ``add_sub_dsp`` adders. Unpaired operands are delayed to keep all the
+    tree branches at the same latency."""
+
+    while len(din) > 1:
+        level = []
+        for i in range(0, len(din) - 1, 2):
+            level.append(add_sub_dsp(din[i], din[i + 1], latency=latency))
+
+        if len(din) % 2:
+            if latency:
+                level.append(din[-1] | pipeline(length=latency))
+            else:
+                level.append(din[-1])
+
+        din = level
+
+    return din[0]
+
+
+@gear
+def fir_systolic(din, *, b, mult_latency=1, add_latency=1, adder=AdderStructure.CHAIN):
+    """Pipelined FIR where each multiplication and addition is registered
+    using the ``mult_dsp`` and ``add_sub_dsp`` latency parameters.
+
+    Parameters
+    ----------
+    mult_latency : int
+        Number of register stages after each multiplier.
+
+    add_latency : int
+        Number of register stages after each adder.
+
+    adder : AdderStructure.CHAIN | AdderStructure.TREE
+        CHAIN cascades the adders through the taps, as in DSP post-adder
+        cascades, while TREE sums all the products with a balanced adder tree.
+    """
+
+    # init delayed input and products
+    x = din
+    mult_b_results = [mult_dsp(x, b[0], latency=mult_latency)]
+
+    if adder == AdderStructure.CHAIN:
+        y_sum = mult_b_results[0]
+
+    # construct filter structure for all fir coefficients
+    for i, b_coef in enumerate(b[1:]):
+
+        # in the chained structure, delay inputs to meet the partial sum of
+        # the previous tap, which is add_latency cycles late for each tap
+        if adder == AdderStructure.CHAIN and add_latency and i > 0:
+            x = x | pipeline(length=add_latency)
+
+        # add delay
+        x = x | dreg(init=0)
+
+        # registered multiplication
+        mult_b_result = mult_dsp(x, b_coef, latency=mult_latency)
+
+        if adder == AdderStructure.CHAIN:
+            # registered summation
+            y_sum = add_sub_dsp(y_sum, mult_b_result, latency=add_latency)
+        elif adder == AdderStructure.TREE:
+            mult_b_results.append(mult_b_result)
+        else:
+            raise Exception(f"Parameter adder has to be chosen from AdderStructure.CHAIN|TREE")
+
+    if adder == AdderStructure.TREE:
+        y_sum = adder_tree(mult_b_results, latency=add_latency)
+
+    # format sum as input
+    return y_sum | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
+
+
+def block_delay_line(din):
+    """Returns the function that gives the sample at an offset from the first
+    sample of the din block. Negative offsets reach into the previous blocks,
+    which are delayed on demand, so that each sample of a previous block is
+    stored only once, however many times it is tapped."""
+
+    p = len(din.dtype)
+
+    # lane samples delayed by a number of blocks
+    delayed = {}
+
+    def sample(offset):
+        blk, lane = divmod(offset, p)
+
+        # sample from the current block
+        if blk == 0:
+            return din[lane]
+
+        # sample from one of the previous blocks
+        if (lane, blk) not in delayed:
+            delayed[(lane, blk)] = sample(offset + p) | dreg(init=0)
+
+        return delayed[(lane, blk)]
+
+    return sample
+
+
+@gear
+def fir_parallel(din: Array, *, b):
+    """Block FIR that filters ``len(din.dtype)`` consecutive samples per
+    transaction. Lanes share a single delay line, where each previous block
+    of samples is stored once and tapped by all the lanes."""
+
+    p = len(din.dtype)
+    t = din.dtype.data
+
+    sample = block_delay_line(din)
+
+    y = []
+    for i in range(p):
+
+        # construct filter structure for all fir coefficients
+        y_sum = sample(i) * b[0]
+        for k, b_coef in enumerate(b[1:], 1):
+            y_sum = y_sum + (sample(i - k) * b_coef)
+
+        # format sum as input
+        y.append(y_sum | qround(fract=t.fract) | saturate(t=t))
+
+    return ccat(*y) | Array
+
+
+def fir_folded_cycles(b, multipliers):
+    """Returns the number of clock cycles ``fir_folded`` spends on each input
+    sample: one cycle to store the sample and one cycle per group of
+    ``multipliers`` taps."""
+
+    return ceil_div(len(b), multipliers) + 1
+
+
+def fir_folded_throughput(b, multipliers):
+    """Returns the ``fir_folded`` capacity in samples per clock cycle."""
+
+    return 1 / fir_folded_cycles(b, multipliers)
+
+
+@gear
+async def fir_folded_addr(din, *, lanes, taps, w_addr, depth) -> \
+        b'(Tuple[Uint[w_addr], din], Queue[Tuple[Array[Uint[w_addr], lanes], Uint[bitw(taps - 1)]]])':
+    """Stores input samples into the circular delay line memory of ``depth``
+    samples and generates the delay line and coefficient read addresses for
+    each MAC iteration. Lane ``j`` processes taps ``j*taps`` to
+    ``(j+1)*taps - 1``."""
+
+    wr_ptr = Uint[w_addr](0)
+
+    # clear delay line memory
+    for clr_addr in range(depth):
+        yield (code(clr_addr, Uint[w_addr]), code(0, din.dtype)), None
+
+    while True:
+        async with din as x:
+            yield (wr_ptr, x), None
+
+            for i in range(taps):
+                rd_addr = [code(wr_ptr - (j * taps + i), Uint[w_addr]) for j in range(lanes)]
+                yield None, ((rd_addr, code(i, Uint[bitw(taps - 1)])), i == taps - 1)
+
+        wr_ptr = code(wr_ptr + 1, Uint[w_addr])
+
+
+@gear
+def fir_folded_mac(wr_addr_data, rd, *, b_lanes):
+    """Reads one delay line sample and one coefficient per lane and sums the
+    products."""
+
+    y_sum = None
+    for j, b_lane in enumerate(b_lanes):
+
+        # read sample and coefficient
+        x = sdp(wr_addr_data, rd[0][j])
+        b_coef = rd[1] | rom_sdp(data=b_lane, dtype=type(b_lane[0]))
+
+        # add to output sum
+        mult_b_result = x * b_coef
+        y_sum = mult_b_result if y_sum is None else y_sum + mult_b_result
+
+    return y_sum
+
+
+@gear
+def fir_folded(din, *, b, multipliers=1, clk_per_sample=None):
+    """Time-multiplexed FIR that shares ``multipliers`` MAC units across all
+    the taps. Delay line and coefficients are kept in ``sdp`` RAMs, read one
+    tap group per cycle, and each input sample takes
+    ``fir_folded_cycles(b, multipliers)`` cycles.
+
+    Parameters
+    ----------
+    multipliers : int
+        Number of multipliers working in parallel.
+
+    clk_per_sample : int
+        Number of clock cycles available per input sample. If set, elaboration
+        fails when the filter cannot process samples at this rate.
+    """
+
+    cycles = fir_folded_cycles(b, multipliers)
+    if clk_per_sample is not None and cycles > clk_per_sample:
+        raise ValueError(
+            f"fir_folded needs {cycles} cycles per sample with {multipliers} multipliers "
+            f"(throughput {fir_folded_throughput(b, multipliers):.4f} samples per clock), "
+            f"but only {clk_per_sample} are available")
+
+    # split padded coefficients into contiguous sections, one per multiplier
+    taps = ceil_div(len(b), multipliers)
+    b = list(b) + [type(b[0])(0)] * (taps * multipliers - len(b))
+    b_lanes = [b[j * taps:(j + 1) * taps] for j in range(multipliers)]
+
+    w_addr = bitw(taps * multipliers - 1)
+    wr_addr_data, rd = din | fir_folded_addr(lanes=multipliers, taps=taps, w_addr=w_addr, depth=2**w_addr)
+
+    # multiply-accumulate over all sections of the delay line
+    mac = rd | queuemap(f=fir_folded_mac(wr_addr_data, b_lanes=b_lanes), balance=decouple)
+    t_acc = mac.dtype.data
+    t_acc = t_acc.base[t_acc.integer + bitw(taps), t_acc.width + bitw(taps)]
+    y_sum = accum(mac, t_acc(0))
+
+    # format sum as input
+    return y_sum | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
+
+
+@gear
+def fir_channelized(din: Tuple, *, b, channels):
+    """Multi-channel FIR for time-multiplexed channels. Input is a
+    ``(channel, sample)`` pair and output is a ``(sample, channel)`` pair. The
+    delay line of each channel is stored in a single ``sdp`` RAM indexed by
+    the channel, and a single array of multipliers is shared by all the
+    channels. Channels can arrive in any order, the delay line written back
+    for the previous sample is forwarded when the next sample belongs to the
+    same channel, since the RAM is read before the write lands."""
+
+    if len(b) < 2:
+        raise ValueError(f"fir_channelized needs at least 2 coefficients, got {len(b)}")
+
+    ch = din[0]
+    x = din[1]
+    t = x.dtype
+    t_state = Array[t, len(b) - 1]
+
+    # read delay line of the channel, initially filled with zeros
+    wr_addr_data = Intf(Tuple[ch.dtype, t_state])
+    state = sdp(wr_addr_data,
+                ch,
+                depth=channels,
+                mem={i: t_state([t(0)] * (len(b) - 1)) for i in range(channels)})
+
+    # keep channel and sample in sync with the delay line read
+    ch = ch | dreg
+    x = x | dreg
+
+    # forward the previous write back, which starts as the zeroed channel 0
+    last_wr = wr_addr_data | decouple(init=wr_addr_data.dtype((0, [t(0)] * (len(b) - 1))))
+    state = field_sel(last_wr[0] == ch, ccat(state, last_wr[1]))
+
+    # write back the delay line shifted by one sample
+    wr_addr_data |= ccat(ch, ccat(x, *[state[i] for i in range(len(b) - 2)]) | Array) | Tuple
+
+    # construct filter structure for all fir coefficients
+    y_sum = x * b[0]
+    for i, b_coef in enumerate(b[1:]):
+        y_sum = y_sum + (state[i] * b_coef)
+
+    # format sum as input
+    return ccat(y_sum | qround(fract=t.fract) | saturate(t=t), ch) | Tuple
+
+
+def fft_twiddles(n, t, inverse=False):
+    """Returns the ``FFT_recursive`` twiddle factors ``[cos, -sin]`` for the
+    ``n`` point FFT, or ``[cos, sin]`` for the inverse FFT, of the type t."""
+
+    sign = 1 if inverse else -1
+    return Array[Array[t, 2], n]([[t(math.cos(2 * math.pi * i / n)), t(sign * math.sin(2 * math.pi * i / n))]
+                                  for i in range(n)])
+
+
+def fir_overlap_save_size(b):
+    """Returns the default ``fir_overlap_save`` FFT size, the smallest power of
+    2 not below ``2*len(b)``, so that at least half of each block are new
+    samples."""
+
+    return 2**math.ceil(math.log2(2 * len(b)))
+
+
+@gear
+def fir_overlap_save(din, *, b, fft_size=None):
+    """FFT fast convolution FIR using the overlap-save method. Each block of
+    ``fft_size - len(b) + 1`` new samples, extended with the last ``len(b) - 1``
+    samples, is transformed with ``FFT_recursive``, multiplied with the
+    precomputed spectrum of ``b``, and transformed back. Only the block outputs
+    not corrupted by the circular convolution are kept. If omitted,
+    ``fft_size`` is given by ``fir_overlap_save_size``."""
+
+    if fft_size is None:
+        fft_size = fir_overlap_save_size(b)
+
+    t = din.dtype
+    n = fft_size
+    m = len(b)
+    hop = n - m + 1
+    stages = int(math.log2(n))
+
+    if 2**stages != n or hop < 1:
+        raise ValueError(f"fft_size needs to be a power of 2 not smaller than len(b)={m}, got {n}")
+
+    # twiddles and filter spectrum precision follows the coefficients
+    t_b = type(b[0])
+    t_w = Fixp[2, t_b.fract + 2]
+    spectrum = np.fft.fft([float(b_coef) for b_coef in b], n)
+    h_int = max(1, math.floor(math.log2(max(abs(spectrum)))) + 2)
+    t_h = Fixp[h_int, h_int + t_b.fract]
+
+    # spectrum is kept wide enough to avoid any overflows
+    t_x = Fixp[t.integer + stages + 1, t.width + stages + 1]
+    t_y = Fixp[t.integer + stages + h_int + 1, t.width + stages + h_int + 1]
+
+    # gather new samples in blocks
+    x = din | parallelize(t=Array[t, hop])
+    sample = block_delay_line(x)
+
+    # extend block with the last m-1 samples, imaginary part is zero
+    zero = t(0)
+    x_block = ccat(*[ccat(sample(i - m + 1), zero) | Array for i in range(n)]) | Array
+
+    # transform block to frequency domain
+    x_spectrum = FFT_recursive(x_block, N=n, Wn=fft_twiddles(n, t_w), output_dtype=t_x)
+
+    # multiply with the filter spectrum
+    y_spectrum = []
+    for k in range(n):
+        xr = x_spectrum[k][0] | format_fixp(t=t_x)
+        xi = x_spectrum[k][1] | format_fixp(t=t_x)
+        hr = t_h(spectrum[k].real)
+        hi = t_h(spectrum[k].imag)
+
+        yr = (xr * hr) - (xi * hi)
+        yi = (xr * hi) + (xi * hr)
+
+        y_spectrum.append(ccat(yr | format_fixp(t=t_y), yi | format_fixp(t=t_y)) | Array)
+
+    # transform back to time domain, scaled by n
+    y_block = FFT_recursive(ccat(*y_spectrum) | Array, N=n, Wn=fft_twiddles(n, t_w, inverse=True), output_dtype=t_y)
+
+    # keep the valid outputs, scale and format them as input
+    y = [(y_block[i][0] >> stages) | qround(fract=t.fract) | saturate(t=t) for i in range(m - 1, n)]
+
+    return ccat(*y) | Array | serialize | project
+
+
+def polyphase_split(b, n):
+    """Splits coefficients ``b`` into ``n`` polyphase subfilters, where the
+    subfilter ``p`` holds coefficients ``b[p::n]``. Subfilters are not padded
+    to the same number of taps, and ``fir_direct_sum`` skips their zero taps,
+    so that no multipliers are spent on them. Subfilters with all the taps
+    zero are returned as ``None``."""
+
+    b = list(b)
+
+    return [b[p::n] if any(float(b_coef) != 0 for b_coef in b[p::n]) else None for p in range(n)]
+
+
+@gear
+def fir_decimate(din, *, b, m):
+    """Polyphase FIR decimator, only every ``m``-th output of the filter ``b``
+    is computed. Output matches ``signal.upfirdn(b, x, down=m)``, i.e. output
+    ``n`` is the filter output at input sample ``n*m``."""
+
+    # gather m consecutive input samples per transaction
+    x = din | parallelize(t=Array[din.dtype, m])
+
+    y_sum = None
+    for p, b_sub in enumerate(polyphase_split(b, m)):
+        if b_sub is None:
+            continue
+
+        # subfilter p processes samples x[n*m - p]
+        if p == 0:
+            x_p = x[0]
+        else:
+            x_p = x[m - p] | dreg(init=0)
+
+        # filter phase at the decimated rate
+        y_p = x_p | fir_direct_sum(b=b_sub)
+
+        # add to output sum
+        y_sum = y_p if y_sum is None else y_sum + y_p
+
+    # format sum as input
+    return y_sum | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
+
+
+@gear
+def fir_interpolate(din, *, b, l):
+    """Polyphase FIR interpolator, each input sample produces ``l`` output
+    samples without filtering the inserted zeros. Output matches
+    ``signal.upfirdn(b, x, up=l)``."""
+
+    y_phases = []
+    for b_sub in polyphase_split(b, l):
+        if b_sub is None:
+            y_phases.append(din.dtype(0))
+            continue
+
+        # filter input at the input rate and format sum as input
+        y_phases.append(
+            din
+            | fir_direct_sum(b=b_sub)
+            | qround(fract=din.dtype.fract)
+            | saturate(t=din.dtype))
+
+    # output phases one after the other
+    return ccat(*y_phases) | Array | serialize | project
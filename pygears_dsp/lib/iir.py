@@ -1,9 +1,25 @@
+import math
+
+import numpy as np
+
 from pygears import gear, Intf
-from pygears.lib import dreg, decouple, saturate, qround
+from pygears.typing import Array, Fixp, Tuple, Uint, bitw, code
+from pygears.lib import ccat, dreg, decouple, field_sel, rom, saturate, sdp, qround
+from pygears_dsp.lib.basic_blocks import coef_bound, coef_max_type, coef_sync, coef_type, fixp_bound, prune
+from pygears_dsp.lib.fir import fir_direct_sum
 
+TSosCfg = Tuple[{
+    'a': Array[Array['t_coef', 3], 'sections'],
+    'b': Array[Array['t_coef', 3], 'sections'],
+    'gain': Array['t_gain', 'sections'],
+    'ogain': 't_ogain'
+}]
 
-@gear
-def iir_1dsos(din, *, a, b, gain):
+
+def iir_1dsos_section(din, a, b, gain, *, prune_sum=False):
+    """Computes the iir_1dsos section. Section gain, b and a can be either
+    constants or interfaces, in which case the sums are pruned to the bounds of
+    their types."""
 
     # add input gain and init delayed inputs
     zu0 = din * gain
@@ -15,7 +31,17 @@ def iir_1dsos(din, *, a, b, gain):
     a2 = a1 + (zu0 * b[0])
 
     # declare output interface and its type
-    y = Intf(a2.dtype)
+    if prune_sum:
+        # output type is kept as with the full precision sums
+        t_zu = zu0.dtype
+        y = Intf((t_zu * coef_type(b[1]) + t_zu * coef_type(b[2])) + t_zu * coef_type(b[0]))
+
+        # remove sum bits that cannot be reached with the coefficients
+        zu_bound = fixp_bound(din.dtype) * coef_bound([gain])
+        a1 = a1 | prune(bound=zu_bound * coef_bound([b[1], b[2]]))
+        a2 = a2 | prune(bound=zu_bound * coef_bound([b[0], b[1], b[2]]))
+    else:
+        y = Intf(a2.dtype)
 
     # init delayed outputs
     zy1 = y | decouple(init=0)
@@ -23,14 +49,29 @@ def iir_1dsos(din, *, a, b, gain):
 
     # perform a coefficient sum
     b1 = (zy2 * a[2]) + (zy1 * a[1])
+    if prune_sum:
+        b1_bound = fixp_bound(y.dtype) * coef_bound([a[1], a[2]])
+        b1 = b1 | prune(bound=b1_bound)
 
-    # add both sums and set output
-    y |= (a2 - b1) | qround(fract=a2.dtype.fract) | saturate(t=a2.dtype)
+    # add both sums
+    y_sum = a2 - b1
+    if prune_sum:
+        y_sum = y_sum | prune(bound=zu_bound * coef_bound([b[0], b[1], b[2]]) + b1_bound)
+
+    # set output
+    y |= y_sum | qround(fract=a2.dtype.fract) | saturate(t=y.dtype)
     return y
 
 
 @gear
-def iir_2tsos(din, *, a, b, gain):
+def iir_1dsos(din, *, a, b, gain, prune_sum=False):
+    return iir_1dsos_section(din, a, b, gain, prune_sum=prune_sum)
+
+
+def iir_2tsos_section(din, a, b, gain, *, prune_sum=False):
+    """Computes the iir_2tsos section. Section gain, b and a can be either
+    constants or interfaces, in which case the sums are pruned to the bounds of
+    their types."""
 
     # add input gain
     x = din * gain
@@ -38,25 +79,45 @@ def iir_2tsos(din, *, a, b, gain):
     # declare output interface and its type
     y = Intf(din.dtype)
 
+    # worst-case magnitudes of the input and the output
+    x_bound = fixp_bound(din.dtype) * coef_bound([gain])
+    y_bound = fixp_bound(din.dtype)
+
     # perform first tap multiplication and sum
     z0 = ((x * b[2]) - (y * a[2]))
+    z0_bound = x_bound * coef_bound([b[2]]) + y_bound * coef_bound([a[2]])
+    if prune_sum:
+        z0 = z0 | prune(bound=z0_bound)
 
     # delay first sum output
     z0_delayed = z0 | dreg(init=0)
 
     # perform second tap multiplication and sum
     z1 = ((x * b[1]) + z0_delayed - (y * a[1]))
+    z1_bound = x_bound * coef_bound([b[1]]) + z0_bound + y_bound * coef_bound([a[1]])
+    if prune_sum:
+        z1 = z1 | prune(bound=z1_bound)
 
     # delay second sum output
     z1_delayed = z1 | decouple(init=0)
 
-    # perform final sum and set output
-    y |= ((x * b[0]) + z1_delayed) | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
+    # perform final sum
+    y_sum = (x * b[0]) + z1_delayed
+    if prune_sum:
+        y_sum = y_sum | prune(bound=x_bound * coef_bound([b[0]]) + z1_bound)
+
+    # set output
+    y |= y_sum | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
     return y
 
 
 @gear
-def iir_df1dsos(din, *, a, b, gain, ogain):
+def iir_2tsos(din, *, a, b, gain, prune_sum=False):
+    return iir_2tsos_section(din, a, b, gain, prune_sum=prune_sum)
+
+
+@gear
+def iir_df1dsos(din, *, a, b, gain, ogain, prune_sum=False):
 
     # init temp
     temp = din
@@ -65,7 +126,7 @@ def iir_df1dsos(din, *, a, b, gain, ogain):
     for i in range(len(b)):
 
         # format every cascaded output as input
-        temp = temp | iir_1dsos(a=a[i], b=b[i], gain=gain[i]) | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
+        temp = temp | iir_1dsos(a=a[i], b=b[i], gain=gain[i], prune_sum=prune_sum) | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
 
     # add output gain and format as input
     dout = (temp * ogain) | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
@@ -73,7 +134,7 @@ def iir_df1dsos(din, *, a, b, gain, ogain):
 
 
 @gear
-def iir_df2tsos(din, *, a, b, gain, ogain):
+def iir_df2tsos(din, *, a, b, gain, ogain, prune_sum=False):
 
     # init temp
     temp = din
@@ -82,8 +143,404 @@ def iir_df2tsos(din, *, a, b, gain, ogain):
     for i in range(len(b)):
 
         # format every cascaded output as input
-        temp = temp | iir_2tsos(a=a[i], b=b[i], gain=gain[i])
+        temp = temp | iir_2tsos(a=a[i], b=b[i], gain=gain[i], prune_sum=prune_sum)
 
     # add output gain and format as input
     dout = (temp * ogain) | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
     return dout
+
+
+def lookahead_coefs(a, b, loop_stages):
+    """
+    Scattered look-ahead transformation of the second order section. Numerator
+    and denominator are multiplied by the same polynomial, so that the only
+    non-zero denominator coefficients are at the delays of loop_stages and
+    2*loop_stages samples.
+
+    Returns
+    -------
+    a_la : list of float
+        Denominator coefficients for the delays of 0, loop_stages and
+        2*loop_stages samples.
+
+    b_la : list of float
+        Numerator coefficients, 2*loop_stages + 1 of them.
+    """
+
+    poles = np.roots([float(a_coef) for a_coef in a])
+
+    # each pole p is moved to p**loop_stages by multiplying with the
+    # sum of (p/z)**j, for j in [0, loop_stages)
+    p_la = np.ones(1)
+    for p in poles:
+        p_la = np.convolve(p_la, [p**j for j in range(loop_stages)])
+
+    a_la = np.real(np.convolve([float(a_coef) for a_coef in a], p_la))
+    b_la = np.real(np.convolve([float(b_coef) for b_coef in b], p_la))
+
+    return list(a_la[::loop_stages]), list(b_la)
+
+
+def lookahead_coefs_fixp(a, b, loop_stages):
+    """lookahead_coefs quantized to the type of a, with the integer part of the
+    numerator type extended to fit the look-ahead numerator."""
+
+    t_coef = type(a[0])
+    a_la, b_la = lookahead_coefs(a, b, loop_stages)
+
+    b_int = max(t_coef.integer, math.floor(math.log2(max(abs(c) for c in b_la))) + 2)
+    t_b = Fixp[b_int, b_int + t_coef.fract]
+
+    return [t_coef(c) for c in a_la], [t_b(c) for c in b_la]
+
+
+@gear
+def iir_lasos(din, *, a, b, gain, loop_stages=2):
+    """
+    Second order section pipelined with the scattered look-ahead, so that the
+    recursion closes over loop_stages samples. This leaves loop_stages-1
+    registers in the feedback loop, which are placed after the multipliers.
+    With loop_stages=1 this is the same as iir_1dsos.
+
+    Additional numerator coefficients are computed in the feed-forward path,
+    which can be pipelined freely. Their type is extended to fit them.
+    """
+
+    a_la, b_la = lookahead_coefs_fixp(a, b, loop_stages)
+
+    # feed-forward part
+    w = (din * gain) | fir_direct_sum(b=b_la)
+
+    # declare output interface and its type
+    y = Intf(w.dtype)
+
+    # outputs delayed by loop_stages and 2*loop_stages samples, multiplied
+    # before the loop registers
+    zy = y | decouple(init=0)
+    zy_k = zy * a_la[1]
+    zy_2k = zy
+    for i in range(loop_stages):
+        zy_2k = zy_2k | dreg(init=0)
+    zy_2k = zy_2k * a_la[2]
+
+    for i in range(loop_stages - 1):
+        zy_k = zy_k | dreg(init=0)
+        zy_2k = zy_2k | dreg(init=0)
+
+    # add both sums and set output
+    y |= (w - (zy_k + zy_2k)) | qround(fract=w.dtype.fract) | saturate(t=w.dtype)
+    return y
+
+
+@gear
+def iir_dflasos(din, *, a, b, gain, ogain, loop_stages=2):
+    """Cascade of the look-ahead pipelined sections iir_lasos, with the same
+    interface as iir_df1dsos."""
+
+    # init temp
+    temp = din
+
+    # add cascades for all b coefficients
+    for i in range(len(b)):
+
+        # format every cascaded output as input
+        temp = temp | iir_lasos(a=a[i], b=b[i], gain=gain[i], loop_stages=loop_stages) \
+            | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
+
+    # add output gain and format as input
+    dout = (temp * ogain) | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
+    return dout
+
+
+# clock cycles the iir_2tsos_folded engine spends on each section
+IIR_FOLDED_SECTION_CYCLES = 2
+
+
+def iir_folded_cycles(sections):
+    """Returns the number of clock cycles iir_2tsos_folded spends on each input
+    sample when processing the given number of sections, including one cycle
+    to pass the sample on."""
+
+    return sections * IIR_FOLDED_SECTION_CYCLES + 1
+
+
+@gear
+async def iir_folded_seq(din, y, *, sections) -> \
+        b'(Tuple[Uint[bitw(sections - 1)], din], din)':
+    """Passes each input sample through all the sections one after the other,
+    feeding the engine output y back as the input of the next section."""
+
+    # input is acknowledged at once, so that the engines in the cascade can
+    # work on consecutive samples
+    async with din as data:
+        u = data
+
+    for i in range(sections):
+        yield (code(i, Uint[bitw(sections - 1)]), u), None
+
+        async with y as y_data:
+            u = y_data
+
+    yield None, u
+
+
+def iir_2tsos_mem(addr, u, gain, b, a, *, depth, ret_addr=False):
+    """
+    Computes the iir_2tsos section output for the sample u, with the section
+    delayed sums z0 and z1 kept in sdp RAM at addr, initially zero. Section
+    gain, b and a can be either constants or interfaces. The delayed sums
+    written back for the previous sample are forwarded when the next one has
+    the same addr, since the RAM is read before the write lands. Returns the
+    output delayed by the memory read, and with ret_addr also addr delayed
+    the same way.
+    """
+
+    t = u.dtype
+
+    # types of the delayed sums as in iir_2tsos
+    t_x = t * coef_type(gain)
+    t_z0 = t_x * coef_type(b[2]) - t * coef_type(a[2])
+    t_z1 = t_x * coef_type(b[1]) + t_z0 - t * coef_type(a[1])
+    t_state = Tuple[t_z1, t_z0]
+
+    # read delayed sums
+    wr_addr_data = Intf(Tuple[addr.dtype, t_state])
+    state = sdp(wr_addr_data, addr, depth=depth, mem={i: t_state((0, 0)) for i in range(depth)})
+
+    # keep address and sample in sync with the memory read
+    addr = addr | dreg
+    u = u | dreg
+
+    # forward the previous write back, which starts as the zeroed addr 0
+    last_wr = wr_addr_data | decouple(init=wr_addr_data.dtype((0, (0, 0))))
+    state = field_sel(last_wr[0] == addr, ccat(state, last_wr[1]))
+
+    # add input gain
+    x = u * gain
+
+    # perform final sum
+    y = ((x * b[0]) + state[0]) | qround(fract=t.fract) | saturate(t=t)
+
+    # perform tap multiplications and sums and write them back
+    z0 = (x * b[2]) - (y * a[2])
+    z1 = (x * b[1]) + state[1] - (y * a[1])
+    wr_addr_data |= ccat(addr, ccat(z1, z0) | Tuple) | Tuple
+
+    if ret_addr:
+        return y, addr
+
+    return y
+
+
+@gear
+def iir_folded_engine(cmd, *, a, b, gain):
+    """Computes one iir_2tsos section per (section, sample) command. Section
+    coefficients are read from ROM, and the section delayed sums are kept in
+    RAM indexed by the section."""
+
+    sec = cmd[0]
+
+    # read section coefficients, of the types wide enough for all the sections
+    t_coef = Tuple[coef_max_type(gain),
+                   Array[coef_max_type([c for sec_b in b for c in sec_b]), 3],
+                   Array[coef_max_type([c for sec_a in a for c in sec_a]), 3]]
+    coef = sec | rom(data=[t_coef((gain[i], b[i], a[i])) for i in range(len(b))], dtype=t_coef)
+
+    return iir_2tsos_mem(sec, cmd[1], coef[0], coef[1], coef[2], depth=len(b))
+
+
+@gear
+def iir_2tsos_folded(din, *, a, b, gain):
+    """Cascade of iir_2tsos sections a, b and gain time-multiplexed onto a
+    single section datapath, see iir_folded_engine."""
+
+    y = Intf(din.dtype)
+    cmd, dout = iir_folded_seq(din, y | decouple, sections=len(b))
+    y |= cmd | iir_folded_engine(a=a, b=b, gain=gain)
+
+    return dout
+
+
+@gear
+def iir_df2tsos_folded(din, *, a, b, gain, ogain, clk_per_sample=None):
+    """
+    Time-multiplexed iir_df2tsos, where the sections share the section
+    datapaths, each one kept as an iir_2tsos_folded engine. Results are the
+    same as with iir_df2tsos.
+
+    Parameters
+    ----------
+    clk_per_sample : int
+        Number of clock cycles available per input sample. Sections are split
+        evenly among the fewest engines that can process samples at this rate.
+        If omitted, a single engine processes all the sections.
+    """
+
+    sections = len(b)
+    if clk_per_sample is None:
+        per_engine = sections
+    else:
+        per_engine = min(sections, (clk_per_sample - 1) // IIR_FOLDED_SECTION_CYCLES)
+        if per_engine == 0:
+            raise ValueError(
+                f"iir_df2tsos_folded needs at least {iir_folded_cycles(1)} cycles per sample, "
+                f"but only {clk_per_sample} are available, use iir_df2tsos instead")
+
+    # split sections evenly among the engines
+    engines = -(-sections // per_engine)
+    bounds = [sections * i // engines for i in range(engines + 1)]
+
+    # init temp
+    temp = din
+
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        temp = temp | iir_2tsos_folded(a=a[lo:hi], b=b[lo:hi], gain=gain[lo:hi])
+
+    # add output gain and format as input
+    dout = (temp * ogain) | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
+    return dout
+
+
+@gear
+def iir_df2tsos_channelized(din: Tuple, *, a, b, gain, ogain, channels):
+    """
+    Multi-channel iir_df2tsos for time-multiplexed channels. Input is a
+    ``(channel, sample)`` pair and output is a ``(sample, channel)`` pair, as
+    with fir_channelized. Each section keeps the delayed sums of all the
+    channels in a single sdp RAM indexed by the channel, so only the memory
+    depth grows with the number of channels. Channels can arrive in any
+    order, see iir_2tsos_mem for the back to back samples of one channel.
+    """
+
+    ch = din[0]
+    temp = din[1]
+    t = temp.dtype
+
+    # add cascades for all b coefficients
+    for i in range(len(b)):
+        temp, ch = iir_2tsos_mem(ch, temp, gain[i], b[i], a[i], depth=channels, ret_addr=True)
+
+    # add output gain and format as input
+    dout = (temp * ogain) | qround(fract=t.fract) | saturate(t=t)
+    return ccat(dout, ch) | Tuple
+
+
+@gear
+def iir_2tsos_block(din: Array, *, a, b, gain):
+    """
+    Block iir_2tsos that filters ``len(din.dtype)`` = P consecutive samples
+    per transaction. The section recursion is unrolled over the block samples,
+    with exactly the iir_2tsos arithmetic including the output rounding and
+    saturation, so the results are the same as when the samples are filtered
+    one by one. Products of the input samples and b do not depend on the
+    recursion and are computed ahead of it, but the feedback path still
+    chains P multiply-adds, one per sample. Where the clock rate matters more
+    than the bit exact results, iir_lasos keeps a single multiply-add in the
+    loop. Delayed sums are passed to the next block through a single feedback
+    register.
+    """
+
+    p = len(din.dtype)
+    t = din.dtype.data
+
+    # types of the delayed sums as in iir_2tsos
+    t_x = t * type(gain)
+    t_z0 = t_x * type(b[2]) - t * type(a[2])
+    t_z1 = t_x * type(b[1]) + t_z0 - t * type(a[1])
+
+    # delayed sums from the previous block
+    state = Intf(Tuple[t_z1, t_z0])
+    state_delayed = state | decouple(init=state.dtype((0, 0)))
+    z1_delayed = state_delayed[0]
+    z0_delayed = state_delayed[1]
+
+    # feed-forward products of all the block samples
+    x = [din[i] * gain for i in range(p)]
+    xb = [[x[i] * b_coef for b_coef in b] for i in range(p)]
+
+    y = []
+    for i in range(p):
+
+        # perform final sum
+        y.append((xb[i][0] + z1_delayed) | qround(fract=t.fract) | saturate(t=t))
+
+        # perform tap sums for the next sample
+        z0 = xb[i][2] - (y[i] * a[2])
+        z1 = xb[i][1] + z0_delayed - (y[i] * a[1])
+        z1_delayed, z0_delayed = z1, z0
+
+    state |= ccat(z1_delayed, z0_delayed) | Tuple
+
+    return ccat(*y) | Array
+
+
+@gear
+def iir_df2tsos_block(din: Array, *, a, b, gain, ogain):
+    """Block iir_df2tsos that filters ``len(din.dtype)`` consecutive samples
+    per transaction, giving the same results as iir_df2tsos."""
+
+    t = din.dtype.data
+
+    # init temp
+    temp = din
+
+    # add cascades for all b coefficients
+    for i in range(len(b)):
+        temp = temp | iir_2tsos_block(a=a[i], b=b[i], gain=gain[i])
+
+    # add output gain and format as input
+    dout = [(temp[i] * ogain) | qround(fract=t.fract) | saturate(t=t) for i in range(len(din.dtype))]
+    return ccat(*dout) | Array
+
+
+@gear
+def iir_1dsos_cfg(din, a, b, gain, *, prune_sum=False):
+    """iir_1dsos with the section coefficients received through interfaces."""
+    return iir_1dsos_section(din, a, b, gain, prune_sum=prune_sum)
+
+
+@gear
+def iir_2tsos_cfg(din, a, b, gain, *, prune_sum=False):
+    """iir_2tsos with the section coefficients received through interfaces."""
+    return iir_2tsos_section(din, a, b, gain, prune_sum=prune_sum)
+
+
+@gear
+def iir_df1dsos_cfg(din, cfg: TSosCfg, *, init=None, prune_sum=False):
+    """iir_df1dsos with a, b, gain and ogain reloadable at runtime through the
+    cfg interface. New coefficients are applied starting with the next input
+    sample, see ``coef_sync``."""
+
+    # pair samples with the active coefficients
+    temp, coef = coef_sync(din, cfg, init=init)
+
+    # add cascades for all b coefficients
+    for i in range(len(cfg.dtype['b'])):
+
+        # format every cascaded output as input
+        temp = iir_1dsos_cfg(temp, coef['a'][i], coef['b'][i], coef['gain'][i], prune_sum=prune_sum) \
+            | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
+
+    # add output gain and format as input
+    dout = (temp * coef['ogain']) | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
+    return dout
+
+
+@gear
+def iir_df2tsos_cfg(din, cfg: TSosCfg, *, init=None, prune_sum=False):
+    """iir_df2tsos with a, b, gain and ogain reloadable at runtime through the
+    cfg interface. New coefficients are applied starting with the next input
+    sample, see ``coef_sync``."""
+
+    # pair samples with the active coefficients
+    temp, coef = coef_sync(din, cfg, init=init)
+
+    # add cascades for all b coefficients
+    for i in range(len(cfg.dtype['b'])):
+
+        # format every cascaded output as input
+        temp = iir_2tsos_cfg(temp, coef['a'][i], coef['b'][i], coef['gain'][i], prune_sum=prune_sum)
+
+    # add output gain and format as input
+    dout = (temp * coef['ogain']) | qround(fract=din.dtype.fract) | saturate(t=din.dtype)
+    return dout
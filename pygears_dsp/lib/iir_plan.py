@@ -0,0 +1,192 @@
+import math
+from enum import IntEnum
+
+import numpy as np
+from scipy import signal
+
+from pygears.typing import Fixp
+
+
+class SosOrder(IntEnum):
+    UP = 0
+    DOWN = 1
+
+
+class SosNorm(IntEnum):
+    L2 = 0
+    LINF = 1
+
+
+# number of frequency points the responses are evaluated at
+PLAN_POINTS = 1024
+
+
+def sos_order(sos, order=SosOrder.UP):
+    """Orders sections by the radius of their poles, UP puts the sections with
+    the poles closest to the unit circle last."""
+
+    radius = [max(abs(np.roots(s[3:]))) for s in sos]
+    idx = sorted(range(len(sos)), key=lambda i: radius[i], reverse=(order == SosOrder.DOWN))
+
+    return np.array([sos[i] for i in idx])
+
+
+def sos_response(sos):
+    """Returns the frequency response of each section."""
+
+    return [signal.freqz(s[:3], s[3:], worN=PLAN_POINTS)[1] for s in sos]
+
+
+def response_norm(h, norm):
+    """L2 norm of the impulse response, or the peak magnitude, computed from
+    the frequency response h."""
+
+    if norm == SosNorm.L2:
+        return math.sqrt(np.mean(abs(h)**2))
+    else:
+        return max(abs(h))
+
+
+def sos_scale(sos, norm=SosNorm.LINF):
+    """
+    Computes section input gains with the Jackson's rule, so that the norm of
+    the response from the filter input to each section output equals one. With
+    LINF scaling sinusoids cannot overflow the section outputs, while L2
+    scaling leaves more bits for the signal but allows the overflows.
+
+    Returns section gains and the output gain, which restores the original
+    filter response.
+    """
+
+    gain = []
+    cum = np.ones(PLAN_POINTS)
+    for h in sos_response(sos):
+        cum = cum * h
+        gain.append(1 / response_norm(cum, norm))
+        cum = cum * gain[-1]
+
+    return gain, 1 / np.prod(gain)
+
+
+def fixp_fit(values, fract):
+    """Returns the Fixp type with the given fraction, wide enough for all the
+    values."""
+
+    peak = max(abs(float(v)) for v in values)
+    integer = max(1, math.floor(math.log2(peak)) + 2) if peak else 1
+    return Fixp[integer, integer + fract]
+
+
+def sos_quantize(sos, t_coef):
+    """Returns the section a and b coefficients quantized to t_coef."""
+
+    b = [[t_coef(float(coef)) for coef in s[0:3]] for s in sos]
+    a = [[t_coef(float(coef)) for coef in s[3:]] for s in sos]
+    return a, b
+
+
+def coef_fract(sos, snr):
+    """Finds the smallest coefficient fraction for which the quantized filter
+    is stable and its response deviates from the original one by less than
+    the target SNR allows."""
+
+    h_ref = np.prod(sos_response(sos), axis=0)
+    max_dev = 10**(-snr / 20) * max(abs(h_ref))
+
+    coefs = [c for s in sos for c in s]
+    for fract in range(4, 64):
+        a, b = sos_quantize(sos, fixp_fit(coefs, fract))
+        sos_q = np.array([[float(c) for c in b[i] + a[i]] for i in range(len(sos))])
+
+        stable = all(max(abs(np.roots(s[3:]))) < 1 for s in sos_q)
+        if stable and max(abs(np.prod(sos_response(sos_q), axis=0) - h_ref)) < max_dev:
+            return fract
+
+    raise ValueError(f"Cannot reach {snr}dB SNR with the coefficients quantization")
+
+
+def data_fract(sos, gain, ogain, snr, integer):
+    """
+    Finds the smallest data fraction for which the noise of rounding the
+    section outputs and the filter output stays the target SNR below the
+    power of the full scale sinusoid.
+
+    Noise of each section output is shaped by the remaining sections, so its
+    power is multiplied by the squared L2 norm of their response. Since
+    iir_df2tsos feeds the rounded output back, the noise is also shaped by the
+    section poles, which is assumed for both implementations. One guard bit
+    is added, since the rounding errors of the neighbouring sections are not
+    quite white as the model assumes.
+    """
+
+    noise_gain = 1
+    resp = sos_response(sos)
+    for k in range(len(sos)):
+        rest = ogain * signal.freqz([1], sos[k][3:], worN=PLAN_POINTS)[1]
+        for i in range(k + 1, len(sos)):
+            rest = rest * resp[i] * gain[i]
+
+        noise_gain += response_norm(rest, SosNorm.L2)**2
+
+    # rounding noise power is q**2/12 for the quantization step q
+    signal_power = (2**(integer - 1))**2 / 2
+    q = math.sqrt(12 * signal_power / (10**(snr / 10) * noise_gain))
+
+    return max(0, math.ceil(-math.log2(q))) + 1
+
+
+def sos_plan(sos, *, snr=60, integer=1, norm=SosNorm.LINF, order=SosOrder.UP):
+    """
+    Plans the fixed point implementation of the filter given in scipy SOS
+    format. Sections are ordered and scaled, and the smallest coefficient and
+    data types reaching the target SNR are chosen.
+
+    Parameters
+    ----------
+    snr : float
+        Target signal to noise ratio in dB, for the full scale sinusoid. The
+        coefficient quantization errors and the rounding noise are each
+        planned for half of the allowed noise power.
+
+    integer : int
+        Integer part width of the data type, including the sign bit.
+
+    norm : SosNorm.L2 | SosNorm.LINF
+        Norm used for the section scaling, see sos_scale.
+
+    order : SosOrder.UP | SosOrder.DOWN
+        Section ordering, see sos_order.
+
+    Returns
+    -------
+    params : dict
+        Parameters a, b, gain and ogain for iir_df1dsos and iir_df2tsos.
+
+    t : Fixp
+        Data type for the filter input.
+
+    Example
+    -------
+    params, t = sos_plan(signal.butter(N=5, Wn=0.3, output='sos'), snr=80)
+    drv(t=t, seq=seq) | iir_df2tsos(**params)
+    """
+
+    sos = sos_order(np.array(sos, dtype=float), order)
+    gain, ogain = sos_scale(sos, norm)
+
+    # coefficient errors and rounding noise get half of the noise power each
+    snr_half = snr + 10 * math.log10(2)
+
+    # coefficient types
+    c_fract = coef_fract(sos, snr_half)
+    a, b = sos_quantize(sos, fixp_fit([c for s in sos for c in s], c_fract))
+    t_gain = fixp_fit(gain + [ogain], c_fract)
+    gain = [t_gain(g) for g in gain]
+
+    # output gain compensates the quantized section gains
+    ogain = t_gain(1 / np.prod([float(g) for g in gain]))
+
+    # data type
+    t = Fixp[integer, integer + data_fract(sos, [float(g) for g in gain], float(ogain), snr_half, integer)]
+
+    return {'a': a, 'b': b, 'gain': gain, 'ogain': ogain}, t
@@ -0,0 +1,211 @@
+import math
+
+import numpy as np
+
+from pygears import gear
+from pygears.typing import Int, Uint, bitw
+from pygears.lib import ccat, dreg, field_sel, saturate
+from pygears_dsp.lib.basic_blocks import rom_sdp
+from pygears_dsp.lib.cordic import cordic_lut, cordic_params, cordic_shifts
+
+# fraction bits kept below the output LSB until the final rounding
+LUT_SIN_COS_FRACT = 3
+
+
+def lut_sin_cos_amplitude(ow, pw, iw=12, norm_gain=False):
+    """Returns the amplitude of the cordic_sin_cos outputs, so that the
+    lut_sin_cos can replace it with the same parameters."""
+
+    amp = (2**(iw - 1) - 1) * 2**(ow - iw - 1)
+    if norm_gain:
+        return amp
+
+    nstages = cordic_params(iw=iw, ow=ow, pw=pw)[2]
+    for shift in cordic_shifts(nstages):
+        amp *= math.sqrt(1 + math.pow(2, -2 * shift))
+
+    return amp
+
+
+def lut_sin_cos_bits(ow, pw, taylor=False):
+    """
+    Returns the address width of the quarter-wave LUT, for which the
+    approximation error stays within a quarter of the output LSB. Without the
+    interpolation the error is half of the LUT step times the slope, while
+    with the first-order Taylor interpolation it falls with the square of the
+    LUT step, so that about half as many address bits are needed.
+    """
+
+    if taylor:
+        lut_bits = math.ceil((ow - 1 + math.log2(math.pi**2 * 2) - 4) / 2)
+    else:
+        lut_bits = math.ceil(ow - 1 + math.log2(math.pi) - 1)
+
+    return min(lut_bits, pw - 2)
+
+
+def lut_sin_tables(lut_bits, pw, amplitude, taylor=False):
+    """Returns the quarter-wave sine LUT and, for the Taylor interpolation, the
+    LUT of the slopes per phase LSB, scaled by 2**(pw - 2). Both are sampled
+    in the middle of the LUT steps, so that the cosine and its slope are read
+    from the same LUTs at the inverted address."""
+
+    lut = cordic_lut(lut_bits, amplitude * 2**LUT_SIN_COS_FRACT)
+    if not taylor:
+        return lut, None
+
+    return lut, cordic_lut(lut_bits, amplitude * 2**LUT_SIN_COS_FRACT * math.pi / 2)
+
+
+def lut_sin_model(phase, lut, dlut, pw):
+    """Bit-accurate model of the lut_sin for the numpy array of phases. Returns
+    the outputs before the final rounding."""
+
+    lut_bits = bitw(len(lut) - 1)
+    rw = pw - 2 - lut_bits
+    lut = np.array(lut, dtype=np.int64)
+
+    addr = (phase >> rw) & (2**lut_bits - 1)
+    inv = (phase >> (pw - 2)) & 1
+    val = np.where(inv, lut[~addr & (2**lut_bits - 1)], lut[addr])
+
+    if dlut is not None and rw > 0:
+        dlut = np.array(dlut, dtype=np.int64)
+        delta = (phase & (2**rw - 1)) - 2**(rw - 1)
+        slope = np.where(inv, dlut[addr], dlut[~addr & (2**lut_bits - 1)])
+        corr = (delta * slope) >> (pw - 2)
+        val = np.where(inv, val - corr, val + corr)
+
+    return np.where((phase >> (pw - 1)) & 1, -val, val)
+
+
+def lut_sin_cos_report(ow, pw, iw=12, norm_gain_sin=False, norm_gain_cos=False, lut_bits=None, taylor=False):
+    """
+    Returns the accuracy of the lut_sin_cos with the given parameters against
+    math.sin and math.cos scaled to the same amplitude, evaluated exhaustively
+    over all the phases, as a dictionary with the following items:
+
+    lut_bits : int
+        Address width of the quarter-wave LUT.
+
+    lut_words : int
+        Number of words in the LUTs, for both outputs and including the
+        slopes for the Taylor interpolation.
+
+    max_err : float
+        Maximum absolute error in the output LSBs.
+
+    rms_err : float
+        RMS error in the output LSBs.
+    """
+
+    if lut_bits is None:
+        lut_bits = lut_sin_cos_bits(ow, pw, taylor)
+
+    taylor = taylor and lut_bits < pw - 2
+    phase = np.arange(2**pw, dtype=np.int64)
+    angle = 2 * math.pi * phase / 2**pw
+
+    err = []
+    lut_words = 0
+    for norm_gain, offset, func in [(norm_gain_sin, 0, np.sin), (norm_gain_cos, 2**(pw - 2), np.cos)]:
+        amp = lut_sin_cos_amplitude(ow, pw, iw, norm_gain)
+        lut, dlut = lut_sin_tables(lut_bits, pw, amp, taylor)
+        lut_words += len(lut) if dlut is None else 2 * len(lut)
+
+        val = lut_sin_model((phase + offset) % 2**pw, lut, dlut, pw)
+        val = (val + 2**(LUT_SIN_COS_FRACT - 1)) >> LUT_SIN_COS_FRACT
+        val = np.clip(val, -2**(ow - 1), 2**(ow - 1) - 1)
+        err.append(val - amp * func(angle))
+
+    err = np.concatenate(err)
+
+    return {
+        'lut_bits': lut_bits,
+        'lut_words': lut_words,
+        'max_err': float(max(abs(err))),
+        'rms_err': float(np.sqrt(np.mean(err**2))),
+    }
+
+
+@gear
+def lut_sin(phase, *, lut, dlut, pw, ww):
+    """Reads the quarter-wave LUT at the phase and mirrors the value into the
+    quadrant of the phase. With the slopes in dlut, adds the first-order Taylor
+    correction for the phase residual, measured from the middle of the LUT
+    step. LUTs are kept in memory, which delays the output by a cycle."""
+
+    lut_bits = bitw(len(lut) - 1)
+    rw = pw - 2 - lut_bits
+
+    addr = phase[rw:pw - 2]
+    inv = phase[pw - 2]
+    neg = phase[pw - 1]
+
+    # sine and its slope are read at the inverted address in the even quadrants
+    val = field_sel(inv, ccat(addr, ~addr)) | rom_sdp(data=lut, dtype=Int[ww])
+
+    if dlut is not None:
+        t_slope = Int[bitw(max(dlut)) + 1]
+        slope = field_sel(inv, ccat(~addr, addr)) | rom_sdp(data=dlut, dtype=t_slope)
+        delta = (phase[:rw] - (1 << (rw - 1))) | dreg
+        corr = (delta * slope) >> (pw - 2)
+
+        val = field_sel(inv | dreg, ccat((val + corr) >> Int[ww], (val - corr) >> Int[ww]))
+
+    return field_sel(neg | dreg, ccat(val, -val >> Int[ww]))
+
+
+@gear
+def lut_sin_cos(phase: Uint['pw'],
+                *,
+                ow,
+                pw=b'pw',
+                iw=12,
+                norm_gain_sin=False,
+                norm_gain_cos=False,
+                lut_bits=None,
+                taylor=False):
+    """
+    Computes sine and cosine of the phase, where 2**pw corresponds to 2*pi,
+    from the quarter-wave LUT, as an alternative to cordic_sin_cos with the
+    same parameters and the outputs of the same amplitude. Processes one phase
+    per clock cycle with the latency of 2 cycles, regardless of the output
+    width. Cosine is computed as the sine of the phase advanced by the quarter
+    wave. Use lut_sin_cos_report to check the accuracy and the LUT size.
+
+    Parameters
+    ----------
+    lut_bits : int
+        Address width of the quarter-wave LUT. If omitted, it is chosen from
+        ow by lut_sin_cos_bits.
+
+    taylor : bool
+        Whether to interpolate between the LUT entries with the first-order
+        Taylor series, which needs a multiplier per output and the LUT of the
+        slopes, but about half as many LUT address bits.
+    """
+
+    if lut_bits is None:
+        lut_bits = lut_sin_cos_bits(ow, pw, taylor)
+
+    if lut_bits < 1 or lut_bits > pw - 2:
+        raise ValueError(f"LUT address width needs to be between 1 and {pw - 2}, got {lut_bits}")
+
+    # with the whole phase addressing the LUT there is no residual left
+    taylor = taylor and lut_bits < pw - 2
+
+    ww = ow + LUT_SIN_COS_FRACT + 1
+    half = Int[LUT_SIN_COS_FRACT + 1](2**(LUT_SIN_COS_FRACT - 1))
+
+    outs = []
+    cos_phase = (phase + Uint[pw](2**(pw - 2))) >> Uint[pw]
+
+    for norm_gain, ph in [(norm_gain_sin, phase), (norm_gain_cos, cos_phase)]:
+        amp = lut_sin_cos_amplitude(ow, pw, iw, norm_gain)
+        lut, dlut = lut_sin_tables(lut_bits, pw, amp, taylor)
+
+        val = ph | lut_sin(lut=lut, dlut=dlut, pw=pw, ww=ww)
+        outs.append(((val + half) >> LUT_SIN_COS_FRACT) | saturate(t=Int[ow]) | dreg)
+
+    return tuple(outs)
@@ -0,0 +1,197 @@
+def csd(k):
+    """Returns the canonical signed digit representation of the integer k, as
+    a list of (shift, sign) pairs, such that k == sum(sign << shift)."""
+
+    digits = []
+    shift = 0
+    while k:
+        if k & 1:
+            sign = 2 - (k & 3)
+            k -= sign
+            digits.append((shift, sign))
+
+        k >>= 1
+        shift += 1
+
+    return digits
+
+
+def fundamental(k):
+    """Splits the integer k into its sign, odd positive fundamental and the
+    number of trailing zeros, such that k == sign * (fund << shift)."""
+
+    sign = -1 if k < 0 else 1
+    fund = abs(k)
+    shift = 0
+    while fund and not fund & 1:
+        fund >>= 1
+        shift += 1
+
+    return sign, fund, shift
+
+
+def mcm_plan(coefs):
+    """
+    Plans the multiplication of a single input with all the integer constants
+    coefs, using only shifts, adders and subtractors.
+
+    Constants are reduced to their odd fundamentals, so that constants which
+    differ only in sign or power of two share the same hardware. Fundamentals
+    are recoded in canonical signed digits, and the most frequent two digit
+    patterns (x << d) + s*x are extracted as subexpressions shared by all the
+    fundamentals.
+
+    Returns
+    -------
+    subexprs : list of (d, s)
+        Shared subexpressions, each with the value (x << d) + s*x.
+
+    terms : dict
+        Maps each fundamental to the list of its (shift, sign, src) terms, where
+        src is None for the input x, or the index of the subexpression.
+    """
+
+    terms = {}
+    for k in coefs:
+        _, fund, _ = fundamental(int(k))
+        if fund:
+            terms[fund] = [(shift, sign, None) for shift, sign in csd(fund)]
+
+    subexprs = []
+    while True:
+        # count two digit patterns among input terms
+        count = {}
+        for fund_terms in terms.values():
+            digits = [t for t in fund_terms if t[2] is None]
+            for i, (lo_shift, lo_sign, _) in enumerate(digits):
+                for hi_shift, hi_sign, _ in digits[i + 1:]:
+                    pattern = (hi_shift - lo_shift, hi_sign * lo_sign)
+                    count[pattern] = count.get(pattern, 0) + 1
+
+        if not count:
+            break
+
+        pattern = max(count, key=lambda p: (count[p], -p[0]))
+        if count[pattern] < 2:
+            break
+
+        # replace non-overlapping pattern occurrences with the subexpression
+        src = len(subexprs)
+        subexprs.append(pattern)
+        d, s = pattern
+        for fund, fund_terms in terms.items():
+            digits = {t[0]: t[1] for t in fund_terms if t[2] is None}
+            new_terms = [t for t in fund_terms if t[2] is not None]
+            for lo_shift in sorted(digits):
+                lo_sign = digits.get(lo_shift)
+                hi_sign = digits.get(lo_shift + d)
+                if lo_sign is not None and hi_sign is not None and hi_sign * lo_sign == s:
+                    new_terms.append((lo_shift, hi_sign, src))
+                    del digits[lo_shift], digits[lo_shift + d]
+
+            new_terms.extend((shift, sign, None) for shift, sign in digits.items())
+            terms[fund] = sorted(new_terms)
+
+    return subexprs, terms
+
+
+def mcm_report(coefs):
+    """
+    Returns the number of adders needed for the constant multiplications by
+    coefs, as a dictionary with the following items:
+
+    coef_adders : list of int
+        Adders spent on each coefficient. Coefficients sharing the fundamental
+        with some previous coefficient spend none.
+
+    shared_adders : int
+        Adders spent on the subexpressions shared by all the coefficients.
+
+    total : int
+        Total number of adders.
+    """
+
+    subexprs, terms = mcm_plan(coefs)
+
+    coef_adders = []
+    done = set()
+    for k in coefs:
+        _, fund, _ = fundamental(int(k))
+        if fund and fund not in done:
+            coef_adders.append(len(terms[fund]) - 1)
+            done.add(fund)
+        else:
+            coef_adders.append(0)
+
+    return {
+        'coef_adders': coef_adders,
+        'shared_adders': len(subexprs),
+        'total': sum(coef_adders) + len(subexprs),
+    }
+
+
+def mcm(din, coefs):
+    """
+    Multiplies the interface din with all the fixed point constants coefs using
+    only shifts, adders and subtractors, as planned by mcm_plan. Returns a list
+    with one product per coefficient, or None for zero coefficients. Products
+    are formed with the coefficient magnitudes, and the coefficient signs are
+    left to the consumer, which can usually absorb them in a subsequent sum.
+    Coefficients with equal magnitudes share the same product.
+
+    Example
+    -------
+    prods = mcm(din, [Fixp[1, 15](0.25), Fixp[1, 15](-0.375)])
+    """
+
+    subexprs, terms = mcm_plan(coefs)
+
+    # shared subexpressions
+    srcs = []
+    for d, s in subexprs:
+        if s > 0:
+            srcs.append((din << d) + din)
+        else:
+            srcs.append((din << d) - din)
+
+    # odd fundamentals, positive term first
+    funds = {}
+    for fund, fund_terms in terms.items():
+        fund_terms = sorted(fund_terms, key=lambda t: -t[1])
+        prod = None
+        for shift, sign, src in fund_terms:
+            term = din if src is None else srcs[src]
+            if shift:
+                term = term << shift
+
+            if prod is None:
+                prod = term
+            elif sign > 0:
+                prod = prod + term
+            else:
+                prod = prod - term
+
+        funds[fund] = prod
+
+    # scale fundamentals by the coefficients power of two and fraction
+    prods = []
+    scaled = {}
+    for k in coefs:
+        _, fund, shift = fundamental(int(k))
+        shift -= type(k).fract
+        if not fund:
+            prods.append(None)
+            continue
+
+        if (fund, shift) not in scaled:
+            prod = funds[fund]
+            if shift > 0:
+                prod = prod << shift
+            elif shift < 0:
+                prod = prod >> -shift
+
+            scaled[(fund, shift)] = prod
+
+        prods.append(scaled[(fund, shift)])
+
+    return prods
@@ -0,0 +1,115 @@
+from pygears import gear
+from pygears.typing import Bool, Uint, code
+from pygears_dsp.lib.cordic import cordic_params, cordic_sin_cos_lut
+
+# dither is taken from the maximal length Galois LFSR x^32 + x^22 + x^2 + x + 1
+NCO_LFSR_WIDTH = 32
+NCO_LFSR_TAPS = 0x80200003
+
+
+def nco_fcw(freq, aw):
+    """Returns the frequency word of the aw bits wide phase accumulator, for
+    the frequency freq relative to the sampling frequency."""
+
+    return Uint[aw](round(freq * 2**aw) % 2**aw)
+
+
+@gear
+async def nco_acc(fcw, *, pw, init, init_valid, dither) -> b'Uint[pw]':
+    """Accumulates the frequency word held in a register, which is updated
+    from the fcw interface whenever a new word waits there. Until the register
+    is valid, only the fcw interface is read."""
+
+    aw = fcw.dtype.width
+
+    freq = fcw.dtype(init)
+    valid = init_valid
+    acc = Uint[aw](0)
+    lfsr = Uint[NCO_LFSR_WIDTH](1)
+
+    while True:
+        if not valid:
+            async with fcw as fcw_data:
+                freq = fcw_data
+                valid = True
+        else:
+            # new word is swapped in between two phases
+            if not fcw.empty():
+                freq = fcw.pull_nb()
+                fcw.ack()
+
+            if dither:
+                yield code(acc + code(lfsr, Uint[aw - pw]), Uint[aw]) >> (aw - pw)
+            else:
+                yield acc >> (aw - pw)
+
+            acc = code(acc + freq, Uint[aw])
+
+            if lfsr[0]:
+                lfsr = code((lfsr >> 1) ^ NCO_LFSR_TAPS, Uint[NCO_LFSR_WIDTH])
+            else:
+                lfsr = code(lfsr >> 1, Uint[NCO_LFSR_WIDTH])
+
+
+@gear
+def nco_phase(fcw: Uint['aw'], *, pw, aw=b'aw', init=None, dither=False):
+    """
+    Phase accumulator, outputs a new phase every clock cycle as the pw MSBs of
+    the accumulated frequency word. Frequency word is a runtime setting: a new
+    word waits on the fcw interface and is swapped in between two phases, so
+    that the phase stays continuous.
+
+    Parameters
+    ----------
+    init : int
+        Frequency word active after reset. If omitted, phase accumulator waits
+        for the first word on the fcw interface.
+
+    dither : bool
+        Whether to add a pseudo-random number below the phase LSB before the
+        accumulator is truncated, which spreads the truncation spurs into the
+        noise floor.
+    """
+
+    # without the bits below the phase LSB there is nothing to dither
+    dither = dither and aw > pw
+
+    if init is None:
+        return fcw | nco_acc(pw=pw, init=fcw.dtype(), init_valid=Bool(False), dither=dither)
+
+    return fcw | nco_acc(pw=pw, init=fcw.dtype(init), init_valid=Bool(True), dither=dither)
+
+
+@gear
+def nco(fcw: Uint['aw'], *, ow, pw=None, lut_bits=6, init=None, dither=False):
+    """
+    Numerically controlled oscillator, outputs sine and cosine of the
+    frequency set by the frequency word fcw, one sample per clock cycle. Phase
+    accumulator drives cordic_sin_cos_lut, which resolves the phase MSBs with
+    the quarter-wave LUT and only the rest with the CORDIC stages.
+
+    Parameters
+    ----------
+    ow : int
+        Output width, sine and cosine are of the full scale of Int[ow].
+
+    pw : int
+        Phase width passed from the accumulator to the sine and cosine
+        computation. If omitted, it is chosen to match the output precision.
+
+    lut_bits : int
+        Address width of the quarter-wave LUT, see cordic_sin_cos_lut.
+
+    init, dither
+        See nco_phase.
+
+    Example
+    -------
+    sin, cos = nco(drv(t=Uint[32], seq=[nco_fcw(0.01, 32)]), ow=16)
+    """
+
+    if pw is None:
+        pw = cordic_params(iw=ow, ow=ow)[0]
+
+    phase = fcw | nco_phase(pw=pw, init=init, dither=dither)
+    return phase | cordic_sin_cos_lut(ow=ow, lut_bits=lut_bits)
@@ -0,0 +1,153 @@
+import traceback
+
+import numpy as np
+import pytest
+from scipy.signal import freqz
+
+from pygears import Intf
+from pygears.hdl import hdlgen
+from pygears.lib import check, drv
+from pygears.sim import log, sim
+from pygears.sim.sim import cosim
+from pygears.typing import Fixp, Float
+from pygears_dsp.lib.cic import (cic_compensation, cic_decimate, cic_gain,
+                                 cic_growth, cic_interpolate)
+from pygears_dsp.lib.fir import fir_direct
+from conftest import set_seed
+
+
+def cic_response(order, ratio, diff_delay):
+    # CIC impulse response is the order times convolved moving sum
+    h = np.ones(1)
+    for _ in range(order):
+        h = np.convolve(h, np.ones(ratio * diff_delay))
+
+    return h
+
+
+@pytest.mark.parametrize('order, ratio, diff_delay', [(3, 8, 1), (4, 16, 2), (5, 64, 1)])
+def test_cic_decimate(order, ratio, diff_delay, seed, do_cosim, target='build/cic'):
+    # Set random seed
+    set_seed(seed)
+
+    log.info(f'Running {__name__} order: {order}, ratio: {ratio}, diff_delay: {diff_delay}, seed: {seed}')
+
+    t = Fixp[1, 15]
+
+    # genrate  random numbers in [-1,1)
+    seq = [t(v) for v in np.random.random(size=(ratio * 20, )) * 2 - 1]
+    log.debug(f'Generated sequence: {seq}')
+
+    # get result, CIC is exact so no deviation is allowed
+    x = [float(v) for v in seq]
+    res = np.convolve(x, cic_response(order, ratio, diff_delay))[:len(x)][ratio - 1::ratio]
+
+    # driving
+    drv(t=t, seq=seq) \
+        | cic_decimate(order=order, ratio=ratio, diff_delay=diff_delay) \
+        | Float \
+        | check(ref=res)
+
+    # optionally generate HDL code do co-simulation in verilator
+    if do_cosim:
+        cosim('/cic_decimate', 'verilator', outdir=target, timeout=1000)
+
+    # simulation start
+    sim(target, check_activity=False)
+
+
+@pytest.mark.parametrize('order, ratio, diff_delay', [(3, 8, 1), (2, 5, 2)])
+def test_cic_interpolate(order, ratio, diff_delay, seed, do_cosim, target='build/cic'):
+    # Set random seed
+    set_seed(seed)
+
+    log.info(f'Running {__name__} order: {order}, ratio: {ratio}, diff_delay: {diff_delay}, seed: {seed}')
+
+    t = Fixp[1, 15]
+
+    # genrate  random numbers in [-1,1)
+    seq = [t(v) for v in np.random.random(size=(20, )) * 2 - 1]
+    log.debug(f'Generated sequence: {seq}')
+
+    # get result, CIC is exact so no deviation is allowed
+    x = np.zeros(len(seq) * ratio)
+    x[::ratio] = [float(v) for v in seq]
+    res = np.convolve(x, cic_response(order, ratio, diff_delay))[:len(x)]
+
+    # driving
+    drv(t=t, seq=seq) \
+        | cic_interpolate(order=order, ratio=ratio, diff_delay=diff_delay) \
+        | Float \
+        | check(ref=res)
+
+    # optionally generate HDL code do co-simulation in verilator
+    if do_cosim:
+        cosim('/cic_interpolate', 'verilator', outdir=target, timeout=1000)
+
+    # simulation start
+    sim(target, check_activity=False)
+
+
+@pytest.mark.parametrize('cic', [cic_decimate, cic_interpolate])
+def test_cic_hdlgen(cic, tmpdir):
+    # rate change needs to be translatable for the fixed point samples
+    cic(Intf(Fixp[1, 15]), order=3, ratio=8, name='dut')
+    hdlgen('/dut', outdir=tmpdir)
+
+
+@pytest.mark.parametrize('diff_delay', [1, 2])
+def test_cic_compensation(diff_delay, seed, do_cosim, target='build/cic'):
+    # Set random seed
+    set_seed(seed)
+
+    order, ratio = 4, 16
+    log.info(f'Running {__name__} order: {order}, ratio: {ratio}, diff_delay: {diff_delay}, seed: {seed}')
+
+    t = Fixp[1, 15]
+
+    # compensation filter with the unity gain, where the center tap can exceed
+    # one with the larger droop
+    b = cic_compensation(15, order=order, ratio=ratio, diff_delay=diff_delay)
+    b_fixp = [Fixp[2, 16](i) for i in b]
+
+    # compensated CIC response is flat within the passband, away from its edge
+    f = np.linspace(0, 0.3, 50)
+    h_cic = abs(freqz(cic_response(order, ratio, diff_delay), worN=np.pi * f / ratio)[1])
+    h_comp = abs(freqz([float(i) for i in b_fixp], worN=np.pi * f)[1])
+    h_db = 20 * np.log10(h_cic * h_comp / cic_gain(order, ratio, diff_delay))
+    assert max(h_db) - min(h_db) < 1
+
+    # genrate  random numbers in [-1,1)
+    seq = [t(v) for v in np.random.random(size=(ratio * 40, )) * 2 - 1]
+    log.debug(f'Generated sequence: {seq}')
+
+    # get result, CIC gain is a power of two
+    x = [float(v) for v in seq]
+    cic = np.convolve(x, cic_response(order, ratio, diff_delay))[:len(x)][ratio - 1::ratio]
+    cic = cic / cic_gain(order, ratio, diff_delay)
+    res = np.convolve(cic, [float(i) for i in b_fixp])[:len(cic)]
+
+    # CIC output normalized to the unity gain, as in the cic_decimate example
+    cic_out = drv(t=t, seq=seq) | cic_decimate(order=order, ratio=ratio, diff_delay=diff_delay)
+    (cic_out >> cic_growth(order, ratio, diff_delay)) \
+        | fir_direct(b=b_fixp) \
+        | Float \
+        | check(ref=res, cmp=lambda x, y: abs(x - y) < 1e-3)
+
+    # optionally generate HDL code do co-simulation in verilator
+    if do_cosim:
+        cosim('/fir_direct', 'verilator', outdir=target, timeout=1000)
+
+    # simulation start
+    sim(target, check_activity=False)
+
+
+# run individual test with python command
+if __name__ == '__main__':
+    try:
+        test_cic_decimate(3, 8, 1, 12, do_cosim=False)
+        log.info("\033[92m //==== PASS ====// \033[90m")
+    except:
+        # printing stack trace
+        traceback.print_exc()
+        log.info("\033[91m //==== FAILED ====// \033[90m")
@@ -1,17 +1,26 @@
 from functools import partial
+import math
+import random
 import traceback
 
 import pytest
 
-from pygears import Intf, reg
-from pygears.lib import directed, drv, verif
-from pygears.sim import cosim, sim, log
+from pygears import Intf, clear, gear, reg
+from pygears.hdl import hdlgen
+from pygears.lib import ccat, check, collect, directed, drv, verif
+from pygears.sim import cosim, sim, log, timestep
 from pygears.sim.modules.verilator import SimVerilated
-from pygears.typing import Int, Tuple, Uint
+from pygears.typing import Array, Fixp, Int, Tuple, Uint, Ufixp
 from pygears.util.test_utils import synth_check
-from pygears_dsp.lib.cordic import (cordic_first_stage, cordic_params,
-                                    cordic_sin_cos, cordic_stage,
-                                    cordic_stages)
+from pygears_dsp.lib.cordic import (calc_cordic_params, cordic, cordic_div,
+                                    cordic_exp, cordic_first_stage,
+                                    cordic_folded_throughput, cordic_lanes,
+                                    cordic_ln, cordic_params,
+                                    cordic_params_table, cordic_sin_cos,
+                                    cordic_sin_cos_lut, cordic_sqrt,
+                                    cordic_stage, cordic_stages,
+                                    cordic_vectoring)
+from conftest import set_seed
 
 
 # FIXME only cosim mode supported
@@ -52,6 +61,21 @@ def test_directed(tmpdir, do_cosim):
     sim(tmpdir, timeout=100)
 
 
+def test_cordic_params_cache():
+    table = cordic_params_table(range(8, 17), range(8, 17))
+    assert len(table) == 81
+
+    # the table fills the cache, so the gears reuse the same parameters
+    hits = calc_cordic_params.cache_info().hits
+    assert cordic_params(iw=12, ow=12) is table[(12, 12)]
+    assert cordic_params(12, 12, 2, None) is table[(12, 12)]
+    assert calc_cordic_params.cache_info().hits == hits + 2
+
+    pw, ww, nstages, cordic_angles, gain = table[(12, 12)]
+    assert len(cordic_angles) == nstages
+    assert cordic_params(iw=12, ow=12, pw=pw + 1) != table[(12, 12)]
+
+
 def test_cordic_stage(tmpdir, do_cosim):
 
     verif(drv(t=Tuple[Int[15], Int[15], Uint[19]],
@@ -68,6 +92,249 @@ def test_cordic_stage(tmpdir, do_cosim):
     sim(tmpdir)
 
 
+@pytest.mark.parametrize('stages_per_reg', [0, 2, 5])
+def test_cordic_stages_per_reg(tmpdir, seed, do_cosim, stages_per_reg):
+    set_seed(seed)
+
+    pw = 19
+
+    # fewer registers must not change the results
+    verif(drv(t=Uint[pw], seq=[random.randint(0, 2**pw - 1) for _ in range(100)]),
+          f=cordic_sin_cos(ow=12, stages_per_reg=stages_per_reg, name='dut'),
+          ref=cordic_sin_cos(ow=12))
+
+    if do_cosim:
+        cosim('/dut', 'verilator')
+
+    sim(tmpdir)
+
+    # a lone vector is delayed a cycle per pipeline register
+    latency = {}
+    for spr in [1, stages_per_reg]:
+        clear()
+        sin, cos = drv(t=Uint[pw], seq=[0]) | cordic_sin_cos(ow=12, stages_per_reg=spr)
+        sin | collect(result=[])
+        cos | collect(result=[])
+
+        sim(tmpdir)
+        latency[spr] = timestep()
+
+    nstages = cordic_params(iw=12, ow=12, pw=pw)[2]
+    nregs = math.ceil(nstages / stages_per_reg) if stages_per_reg else 0
+    assert latency[1] - latency[stages_per_reg] == nstages - nregs
+
+
+def test_cordic_folded(tmpdir, seed, do_cosim):
+    set_seed(seed)
+
+    pw = 19
+    ow = 12
+    num = 50
+
+    # folded stages must not change the results
+    verif(drv(t=Uint[pw], seq=[random.randint(0, 2**pw - 1) for _ in range(num)]),
+          f=cordic_sin_cos(ow=ow, folded=True, name='dut'),
+          ref=cordic_sin_cos(ow=ow))
+
+    if do_cosim:
+        cosim('/dut', 'verilator')
+
+    sim(tmpdir)
+
+    # few cycles of margin for the pipeline latency
+    assert timestep() <= num / cordic_folded_throughput(iw=12, ow=ow, pw=pw) + 10
+
+
+def test_cordic_folded_stages_per_reg():
+    # folded engine has no stage chain to split with the registers
+    with pytest.raises(Exception):
+        drv(t=Uint[19], seq=[0]) | cordic_sin_cos(ow=12, folded=True, stages_per_reg=2)
+
+
+@pytest.mark.parametrize('lanes', [1, 4])
+def test_cordic_lanes(tmpdir, seed, do_cosim, lanes):
+    set_seed(seed)
+
+    iw = 12
+    pw = 19
+    num = 50
+
+    seq = [[(random.randint(-2**(iw - 1) + 1, 2**(iw - 1) - 1),
+             random.randint(-2**(iw - 1) + 1, 2**(iw - 1) - 1), random.randint(0, 2**pw - 1))
+            for _ in range(lanes)] for _ in range(num)]
+
+    @gear
+    def cordic_lanes_ref(din):
+        return ccat(*[cordic(din[i][0], din[i][1], din[i][2]) for i in range(lanes)]) | Array
+
+    # each lane matches the single lane cordic
+    verif(drv(t=Array[Tuple[Int[iw], Int[iw], Uint[pw]], lanes], seq=seq),
+          f=cordic_lanes(name='dut'),
+          ref=cordic_lanes_ref)
+
+    if do_cosim:
+        cosim('/dut', 'verilator')
+
+    sim(tmpdir)
+
+    # all the lanes are processed in a single clock cycle
+    assert timestep() <= num + 30
+
+
+@pytest.mark.parametrize('lut_bits', [2, 6])
+def test_cordic_sin_cos_lut(tmpdir, seed, do_cosim, lut_bits):
+    set_seed(seed)
+
+    ow = 12
+    pw = cordic_params(iw=ow, ow=ow)[0]
+    amp = 2**(ow - 1) - 1
+
+    phase_seq = [random.randint(0, 2**pw - 1) for _ in range(200)]
+    angles = [2 * math.pi * p / 2**pw for p in phase_seq]
+
+    sin, cos = drv(t=Uint[pw], seq=phase_seq) \
+        | cordic_sin_cos_lut(ow=ow, lut_bits=lut_bits, name='dut')
+
+    # results are within an output LSB
+    cmp = lambda res, ref: abs(int(res) - float(ref)) <= 1
+    sin | check(ref=[amp * math.sin(a) for a in angles], cmp=cmp)
+    cos | check(ref=[amp * math.cos(a) for a in angles], cmp=cmp)
+
+    if do_cosim:
+        cosim('/dut', 'verilator')
+
+    sim(tmpdir)
+
+
+def test_cordic_vectoring(tmpdir, seed, do_cosim):
+    set_seed(seed)
+
+    iw = 12
+    ow = 12
+    pw = cordic_params(iw=iw, ow=ow)[0]
+
+    # vectors in all the octants, at least quarter of the full scale
+    xval, yval = [], []
+    while len(xval) < 200:
+        x = random.randint(-2**(iw - 1), 2**(iw - 1) - 1)
+        y = random.randint(-2**(iw - 1), 2**(iw - 1) - 1)
+        if math.hypot(x, y) >= 2**(iw - 3):
+            xval.append(x)
+            yval.append(y)
+
+    # magnitude is scaled as the cordic outputs
+    ref = []
+    for x, y in zip(xval, yval):
+        mag = math.hypot(x, y) * 2**(ow - iw - 1)
+        phase = (math.atan2(y, x) % (2 * math.pi)) * 2**pw / (2 * math.pi)
+        ref.append((mag, phase))
+
+    def cmp(res, ref):
+        # phase wraps around
+        phase_err = (int(res[1]) - ref[1] + 2**(pw - 1)) % 2**pw - 2**(pw - 1)
+        return abs(int(res[0]) - ref[0]) < 2 and abs(phase_err) < 2**(pw - ow)
+
+    cordic_vectoring(drv(t=Int[iw], seq=xval), drv(t=Int[iw], seq=yval), ow=ow) \
+        | check(ref=ref, cmp=cmp)
+
+    if do_cosim:
+        cosim('/cordic_vectoring', 'verilator')
+
+    sim(tmpdir)
+
+
+def test_cordic_vectoring_hdlgen(tmpdir):
+    # quadrant selection needs to be translatable
+    cordic_vectoring(Intf(Int[12]), Intf(Int[12]), ow=12, name='dut')
+    hdlgen('/dut', outdir=tmpdir)
+
+
+@pytest.mark.parametrize('func, ref_func, t', [
+    (cordic_sqrt, math.sqrt, Ufixp[4, 16]),
+    (cordic_ln, math.log, Ufixp[4, 16]),
+    (cordic_exp, math.exp, Fixp[3, 16]),
+])
+def test_cordic_fn(tmpdir, seed, do_cosim, func, ref_func, t):
+    set_seed(seed)
+
+    ow = 16
+
+    # logarithm is not defined for zero
+    seq = [t.decode(random.randint(1, 2**t.width - 1)) for _ in range(200)]
+
+    res = []
+    drv(t=t, seq=seq) | func(ow=ow, name='dut') | collect(result=res)
+
+    if do_cosim:
+        cosim('/dut', 'verilator')
+
+    sim(tmpdir)
+
+    # results are within an output LSB
+    for x, y in zip(seq, res):
+        assert abs(float(y) - ref_func(float(x))) < 2**-type(y).fract
+
+
+def test_cordic_div(tmpdir, seed, do_cosim):
+    set_seed(seed)
+
+    iw = 12
+    ow = 16
+
+    # quotients up to 2 converge
+    num, den = [], []
+    while len(num) < 200:
+        x = random.randint(-2**(iw - 1), 2**(iw - 1) - 1)
+        y = random.randint(-2**(iw - 1), 2**(iw - 1) - 1)
+        if abs(x) < 2 * abs(y) - 1:
+            num.append(x)
+            den.append(y)
+
+    cordic_div(drv(t=Int[iw], seq=num), drv(t=Int[iw], seq=den), ow=ow, name='dut') \
+        | check(ref=[x / y for x, y in zip(num, den)],
+                cmp=lambda res, ref: abs(float(res) - float(ref)) < 2**-(ow - 2))
+
+    if do_cosim:
+        cosim('/dut', 'verilator')
+
+    sim(tmpdir)
+
+
+def test_cordic_div_zero(tmpdir, seed, do_cosim):
+    set_seed(seed)
+
+    iw = 12
+    ow = 16
+    t = Fixp[2, ow]
+
+    num = [random.randint(-2**(iw - 1), 2**(iw - 1) - 1) for _ in range(20)] + [0]
+
+    # quotients saturate to the limit of the dividend sign
+    cordic_div(drv(t=Int[iw], seq=num), drv(t=Int[iw], seq=[0] * len(num)), ow=ow, name='dut') \
+        | check(ref=[t.min if x < 0 else t.max for x in num])
+
+    if do_cosim:
+        cosim('/dut', 'verilator')
+
+    sim(tmpdir)
+
+
+@pytest.mark.parametrize('func, t', [
+    (cordic_sqrt, Ufixp[4, 16]),
+    (cordic_ln, Ufixp[4, 16]),
+    (cordic_exp, Fixp[3, 16]),
+])
+def test_cordic_fn_hdlgen(tmpdir, func, t):
+    # normalization needs to be translatable
+    func(Intf(t), ow=16, name='dut')
+    hdlgen('/dut', outdir=tmpdir)
+
+
+def test_cordic_div_hdlgen(tmpdir):
+    cordic_div(Intf(Int[12]), Intf(Int[12]), ow=16, name='dut')
+    hdlgen('/dut', outdir=tmpdir)
+
+
 @synth_check({
     'logic luts': 0,
     'ffs': 0
@@ -4,14 +4,22 @@ import traceback
 
 import numpy as np
 import pytest
+from scipy.signal import upfirdn
 from scipy.signal.fir_filter_design import firwin
 
-from pygears import reg
-from pygears.lib import check, drv
-from pygears.sim import log, sim
+from pygears import Intf, find, gear, reg
+from pygears.hdl import hdlgen
+from pygears.lib import check, drv, project, serialize, verif
+from pygears.sim import log, sim, timestep
 from pygears.sim.sim import cosim
-from pygears.typing import Fixp, Float
-from pygears_dsp.lib.fir import fir_direct, fir_transposed
+from pygears.typing import Array, Fixp, Float, Tuple, Uint
+from pygears_dsp.lib.fir import (AdderStructure, fir_channelized, fir_decimate,
+                                 fir_direct, fir_direct_cfg, fir_folded,
+                                 fir_folded_cycles, fir_halfband,
+                                 fir_interpolate, fir_multiplierless,
+                                 fir_overlap_save, fir_overlap_save_size,
+                                 fir_parallel, fir_symmetric, fir_systolic,
+                                 fir_transposed)
 from conftest import (fixp_sat, random_choice_seq, random_seq, set_seed,
                       sine_seq)
 
@@ -53,7 +61,7 @@ def fir_sim(impl, t_b, seq, do_cosim, target='build/fir'):
     return res
 
 
-@pytest.mark.parametrize('impl', [fir_direct, fir_transposed])
+@pytest.mark.parametrize('impl', [fir_direct, fir_transposed, fir_symmetric])
 def test_fir_random(impl, seed, do_cosim):
     # Set random seed
     set_seed(seed)
@@ -69,7 +77,7 @@ def test_fir_random(impl, seed, do_cosim):
     res = fir_sim(impl, t_b, seq, do_cosim=do_cosim)
 
 
-@pytest.mark.parametrize('impl', [fir_direct, fir_transposed])
+@pytest.mark.parametrize('impl', [fir_direct, fir_transposed, fir_symmetric])
 def test_fir_random_type(impl, seed, do_cosim):
     # Set random seed
     set_seed(seed)
@@ -100,7 +108,7 @@ def test_fir_random_type(impl, seed, do_cosim):
     res = fir_sim(impl, t_b, seq, do_cosim=do_cosim)
 
 
-@pytest.mark.parametrize('impl', [fir_direct, fir_transposed])
+@pytest.mark.parametrize('impl', [fir_direct, fir_transposed, fir_symmetric])
 @pytest.mark.parametrize('fixp_w', range(16, 33, 4))
 @pytest.mark.parametrize('int_w', range(1, 3))
 def test_fir_limits(fixp_w, int_w, impl, seed, do_cosim):
@@ -126,7 +134,7 @@ def test_fir_limits(fixp_w, int_w, impl, seed, do_cosim):
     res = fir_sim(impl, t_b, seq, do_cosim=do_cosim)
 
 
-@pytest.mark.parametrize('impl', [fir_direct, fir_transposed])
+@pytest.mark.parametrize('impl', [fir_direct, fir_transposed, fir_symmetric])
 @pytest.mark.parametrize('freq', [10_000, 100_000, 1_000_000])
 def test_fir_sine(freq, impl, seed, do_cosim):
     """[Drive filter with sine signal at fs fs/2 and fs*2 
@@ -153,6 +161,498 @@ def test_fir_sine(freq, impl, seed, do_cosim):
     res = fir_sim(impl, t_b, seq, do_cosim=do_cosim)
 
 
+@pytest.mark.parametrize('adder', [AdderStructure.CHAIN, AdderStructure.TREE])
+@pytest.mark.parametrize('mult_latency', [0, 2])
+@pytest.mark.parametrize('add_latency', [0, 1, 3])
+def test_fir_systolic(adder, mult_latency, add_latency, seed, do_cosim):
+    # Set random seed
+    set_seed(seed)
+
+    log.info(f'Running {__name__} adder: {adder}, seed: {seed}')
+
+    t_b = Fixp[1, 15]
+
+    # genrate  random numbers in [-1,1)
+    seq = np.random.random(size=(100, )) * 2 - 1
+    log.debug(f'Generated sequence: {seq}')
+
+    impl = fir_systolic(adder=adder,
+                        mult_latency=mult_latency,
+                        add_latency=add_latency)
+
+    res = fir_sim(impl, t_b, seq, do_cosim=do_cosim)
+
+
+@pytest.mark.parametrize('p', [1, 2, 4, 8])
+def test_fir_parallel(p, seed, do_cosim, target='build/fir'):
+    # Set random seed
+    set_seed(seed)
+
+    log.info(f'Running {__name__} p: {p}, seed: {seed}')
+
+    t_b = Fixp[1, 15]
+
+    # get 'b' factors
+    b = firwin(8, [0.05, 0.95], width=0.05, pass_zero=False)
+    b_fixp = [t_b(i) for i in b]
+
+    # genrate  random numbers in [-1,1)
+    seq = np.random.random(size=(100 * p, )) * 2 - 1
+    log.debug(f'Generated sequence: {seq}')
+
+    # get result
+    res = np.convolve(seq, b)[:len(seq)]
+
+    # saturate the results value to filter output type if needed
+    for i, r in enumerate(res):
+        res[i] = fixp_sat(t_b, r)
+
+    # driving p samples per transaction
+    drv(t=Array[t_b, p], seq=[list(seq[i:i + p]) for i in range(0, len(seq), p)]) \
+        | fir_parallel(b=b_fixp) \
+        | serialize \
+        | project \
+        | Float \
+        | check(ref=res, cmp=fir_compare)
+
+    # optionally generate HDL code do co-simulation in verilator
+    if do_cosim:
+        cosim('/fir_parallel', 'verilator', outdir=target, timeout=1000)
+
+    # simulation start
+    sim(target, check_activity=False)
+
+
+@pytest.mark.parametrize('multipliers', [1, 3, 8])
+def test_fir_folded(multipliers, seed, do_cosim):
+    # Set random seed
+    set_seed(seed)
+
+    log.info(f'Running {__name__} multipliers: {multipliers}, seed: {seed}')
+
+    t_b = Fixp[1, 15]
+
+    # genrate  random numbers in [-1,1)
+    seq = np.random.random(size=(100, )) * 2 - 1
+    log.debug(f'Generated sequence: {seq}')
+
+    res = fir_sim(fir_folded(multipliers=multipliers), t_b, seq, do_cosim=do_cosim)
+
+
+@pytest.mark.parametrize('multipliers', [1, 3])
+def test_fir_folded_hdlgen(multipliers, tmpdir):
+    b_fixp = [Fixp[1, 15](0.1)] * 8
+
+    fir_folded(Intf(Fixp[1, 15]), b=b_fixp, multipliers=multipliers, name='dut')
+    hdlgen('/dut', outdir=tmpdir)
+
+
+@gear
+async def output_times(din, *, result):
+    async with din:
+        result.append(timestep())
+
+
+@pytest.mark.parametrize('multipliers', [1, 3])
+def test_fir_folded_rate(multipliers, tmpdir):
+    b_fixp = [Fixp[1, 15](0.1)] * 8
+    cycles = fir_folded_cycles(b_fixp, multipliers)
+
+    # with the input always available, outputs are cycles apart
+    times = []
+    drv(t=Fixp[1, 15], seq=[0.5] * 20) \
+        | fir_folded(b=b_fixp, multipliers=multipliers) \
+        | output_times(result=times)
+
+    sim(tmpdir)
+
+    assert len(times) == 20
+    assert all(t1 - t0 == cycles for t0, t1 in zip(times[1:], times[2:]))
+
+    with pytest.raises(Exception):
+        drv(t=Fixp[1, 15], seq=[0]) | fir_folded(b=b_fixp, multipliers=2, clk_per_sample=4)
+
+
+@pytest.mark.parametrize('channels', [2, 5, 32])
+def test_fir_channelized(channels, seed, do_cosim, target='build/fir'):
+    # Set random seed
+    set_seed(seed)
+
+    log.info(f'Running {__name__} channels: {channels}, seed: {seed}')
+
+    t_b = Fixp[1, 15]
+
+    # get 'b' factors
+    b = firwin(8, [0.05, 0.95], width=0.05, pass_zero=False)
+    b_fixp = [t_b(i) for i in b]
+
+    # genrate  random numbers in [-1,1) for each channel
+    seq = np.random.random(size=(50, channels)) * 2 - 1
+    log.debug(f'Generated sequence: {seq}')
+
+    # get result for each channel
+    res = np.array([np.convolve(seq[:, ch], b)[:len(seq)] for ch in range(channels)]).T
+
+    # saturate the results value to filter output type if needed
+    res = [[fixp_sat(t_b, r) for r in row] for row in res]
+
+    # channel samples are interleaved
+    drv(t=Tuple[Uint[8], t_b], seq=[(ch, seq[n, ch]) for n in range(len(seq)) for ch in range(channels)]) \
+        | fir_channelized(b=b_fixp, channels=channels) \
+        | check(ref=[(res[n][ch], ch) for n in range(len(seq)) for ch in range(channels)],
+                cmp=lambda x, y: fir_compare(float(x[0]), float(y[0])) and x[1] == y[1])
+
+    # optionally generate HDL code do co-simulation in verilator
+    if do_cosim:
+        cosim('/fir_channelized', 'verilator', outdir=target, timeout=1000)
+
+    # simulation start
+    sim(target, check_activity=False)
+
+
+@pytest.mark.parametrize('channels', [1, 3])
+def test_fir_channelized_order(channels, seed, do_cosim, target='build/fir'):
+    """[Channels arriving out of the round-robin order, also back to back,
+    need to use the up to date delay lines
+    """
+    set_seed(seed)
+
+    log.info(f'Running {__name__} channels: {channels}, seed: {seed}')
+
+    t_b = Fixp[1, 15]
+    b = firwin(8, [0.05, 0.95], width=0.05, pass_zero=False)
+    b_fixp = [t_b(i) for i in b]
+
+    order = [random.randrange(channels) for _ in range(100)]
+    seq = np.random.random(size=(len(order), )) * 2 - 1
+
+    # filter each channel separately, and restore the arrival order
+    ref = [None] * len(order)
+    for ch in range(channels):
+        idx = [n for n, c in enumerate(order) if c == ch]
+        for n, r in zip(idx, np.convolve(seq[idx], b)[:len(idx)]):
+            ref[n] = (fixp_sat(t_b, r), ch)
+
+    drv(t=Tuple[Uint[8], t_b], seq=list(zip(order, seq))) \
+        | fir_channelized(b=b_fixp, channels=channels) \
+        | check(ref=ref, cmp=lambda x, y: fir_compare(float(x[0]), float(y[0])) and x[1] == y[1])
+
+    if do_cosim:
+        cosim('/fir_channelized', 'verilator', outdir=target, timeout=1000)
+
+    sim(target, check_activity=False)
+
+
+@pytest.mark.parametrize('impl', [fir_direct, fir_transposed])
+def test_fir_prune(impl, seed, do_cosim, target='build/fir'):
+    """[Pruned sums need to give the same results as the full precision ones
+    """
+    # Set random seed
+    set_seed(seed)
+
+    log.info(f'Running {__name__} impl: {impl}, seed: {seed}')
+
+    t_b = Fixp[2, 20]
+
+    # get 'b' factors
+    b = firwin(32, [0.05, 0.95], width=0.05, pass_zero=False)
+    b_fixp = [Fixp[1, 15](i) for i in b]
+
+    # extremes result in the largest sums
+    seq = random_choice_seq([[t_b.fmin] * 40, [t_b.fmax] * 40, [0] * 40], 10)
+    log.debug(f'Generated sequence: {seq}')
+
+    verif(drv(t=t_b, seq=seq),
+          f=impl(b=b_fixp, prune_sum=True, name='dut'),
+          ref=impl(b=b_fixp))
+
+    # optionally generate HDL code do co-simulation in verilator
+    if do_cosim:
+        cosim('/dut', 'verilator', outdir=target, timeout=1000)
+
+    # simulation start
+    sim(target, check_activity=False)
+
+
+@pytest.mark.parametrize('num', [8, 31, 64])
+def test_fir_multiplierless(num, seed, do_cosim, target='build/fir'):
+    """[Shift-add constant multiplications need to give the same results as
+    the multipliers
+    """
+    # Set random seed
+    set_seed(seed)
+
+    log.info(f'Running {__name__} num: {num}, seed: {seed}')
+
+    t_b = Fixp[1, 15]
+
+    # get 'b' factors
+    b = firwin(num, [0.05, 0.95], width=0.05, pass_zero=False)
+    b_fixp = [t_b(i) for i in b]
+
+    # genrate  random numbers in [-1,1)
+    seq = np.random.random(size=(100, )) * 2 - 1
+    log.debug(f'Generated sequence: {seq}')
+
+    verif(drv(t=t_b, seq=seq),
+          f=fir_multiplierless(b=b_fixp, name='dut'),
+          ref=fir_transposed(b=b_fixp))
+
+    # optionally generate HDL code do co-simulation in verilator
+    if do_cosim:
+        cosim('/dut', 'verilator', outdir=target, timeout=1000)
+
+    # simulation start
+    sim(target, check_activity=False)
+
+
+@pytest.mark.parametrize('init', [None, [0] * 8])
+def test_fir_direct_cfg(init, seed, do_cosim, target='build/fir'):
+    # Set random seed
+    set_seed(seed)
+
+    log.info(f'Running {__name__} init: {init}, seed: {seed}')
+
+    t_b = Fixp[1, 15]
+
+    # get 'b' factors
+    b = firwin(8, [0.05, 0.95], width=0.05, pass_zero=False)
+    b_fixp = [t_b(i) for i in b]
+
+    # coefficients are loaded while the filter is fed with zeros
+    seq = [0] * 10
+    seq.extend(np.random.random(size=(100, )) * 2 - 1)
+    log.debug(f'Generated sequence: {seq}')
+
+    # get result
+    res = np.convolve(seq, b)[:len(seq)]
+
+    # saturate the results value to filter output type if needed
+    for i, r in enumerate(res):
+        res[i] = fixp_sat(t_b, r)
+
+    # driving
+    fir_direct_cfg(drv(t=t_b, seq=seq), drv(t=Array[t_b, len(b)], seq=[b_fixp]), init=init) \
+        | Float \
+        | check(ref=res, cmp=fir_compare)
+
+    # optionally generate HDL code do co-simulation in verilator
+    if do_cosim:
+        cosim('/fir_direct_cfg', 'verilator', outdir=target, timeout=1000)
+
+    # simulation start
+    sim(target, check_activity=False)
+
+
+@pytest.mark.parametrize('init', [None, [0] * 8])
+def test_fir_direct_cfg_hdlgen(init, tmpdir):
+    t_b = Fixp[1, 15]
+
+    # coefficient register needs to be translatable with and without reset values
+    fir_direct_cfg(Intf(t_b), Intf(Array[t_b, 8]), init=init, name='dut')
+    hdlgen('/dut', outdir=tmpdir)
+
+
+def test_fir_overlap_save_size():
+    # smallest power of 2 that holds at least as many new samples as taps
+    assert fir_overlap_save_size([0] * 8) == 16
+    assert fir_overlap_save_size([0] * 17) == 64
+
+
+@pytest.mark.parametrize('num, fft_size', [(8, 16), (17, 32), (17, None)])
+def test_fir_overlap_save(num, fft_size, seed, do_cosim, target='build/fir'):
+    # Set random seed
+    set_seed(seed)
+
+    log.info(f'Running {__name__} num: {num}, fft_size: {fft_size}, seed: {seed}')
+
+    t_b = Fixp[1, 15]
+
+    # get 'b' factors
+    b = firwin(num, [0.05, 0.95], width=0.05, pass_zero=False)
+    b_fixp = [t_b(i) for i in b]
+
+    # default FFT size is sized from the number of taps
+    n = fft_size or fir_overlap_save_size(b_fixp)
+
+    # genrate  random numbers in [-1,1), outputs are produced in whole blocks
+    seq = np.random.random(size=((n - num + 1) * 8, )) * 2 - 1
+    log.debug(f'Generated sequence: {seq}')
+
+    # get result
+    res = np.convolve(seq, b)[:len(seq)]
+
+    # saturate the results value to filter output type if needed
+    for i, r in enumerate(res):
+        res[i] = fixp_sat(t_b, r)
+
+    # driving
+    drv(t=t_b, seq=seq) \
+        | fir_overlap_save(b=b_fixp, fft_size=fft_size) \
+        | Float \
+        | check(ref=res, cmp=lambda x, y: abs(x - y) < 1e-3)
+
+    # optionally generate HDL code do co-simulation in verilator
+    if do_cosim:
+        cosim('/fir_overlap_save', 'verilator', outdir=target, timeout=1000)
+
+    # simulation start
+    sim(target, check_activity=False)
+
+
+@pytest.mark.parametrize('decimate', [False, True])
+@pytest.mark.parametrize('num', [11, 13, 31])
+def test_fir_halfband(num, decimate, seed, do_cosim, target='build/fir'):
+    # Set random seed
+    set_seed(seed)
+
+    log.info(f'Running {__name__} num: {num}, decimate: {decimate}, seed: {seed}')
+
+    t_b = Fixp[1, 15]
+
+    # get half-band 'b' factors
+    b = firwin(num, 0.5)
+    b_fixp = [t_b(i) for i in b]
+
+    # genrate  random numbers in [-1,1)
+    seq = np.random.random(size=(100, )) * 2 - 1
+    log.debug(f'Generated sequence: {seq}')
+
+    # get result
+    down = 2 if decimate else 1
+    res = upfirdn([float(i) for i in b_fixp], seq, down=down)[:len(seq) // down]
+
+    # saturate the results value to filter output type if needed
+    for i, r in enumerate(res):
+        res[i] = fixp_sat(t_b, r)
+
+    # driving
+    drv(t=t_b, seq=seq) \
+        | fir_halfband(b=b_fixp, decimate=decimate) \
+        | Float \
+        | check(ref=res, cmp=fir_compare)
+
+    # optionally generate HDL code do co-simulation in verilator
+    if do_cosim:
+        cosim('/fir_halfband', 'verilator', outdir=target, timeout=1000)
+
+    # simulation start
+    sim(target, check_activity=False)
+
+
+def test_fir_halfband_reject():
+    b = firwin(11, [0.05, 0.95], width=0.05, pass_zero=False)
+    b_fixp = [Fixp[1, 15](i) for i in b]
+
+    with pytest.raises(Exception):
+        drv(t=Fixp[1, 15], seq=[0]) | fir_halfband(b=b_fixp)
+
+
+def test_fir_symmetric_reject():
+    b_fixp = [Fixp[1, 15](i) for i in [0.1, 0.2, 0.3]]
+
+    with pytest.raises(Exception):
+        drv(t=Fixp[1, 15], seq=[0]) | fir_symmetric(b=b_fixp)
+
+
+def fir_rate_sim(impl, t_b, seq, do_cosim, *, up=1, down=1,
+                 target='build/fir'):
+    # get 'b' factors
+    b = firwin(8, [0.05, 0.95], width=0.05, pass_zero=False)
+    b_fixp = [t_b(i) for i in b]
+
+    # get result
+    res = upfirdn(b, seq, up=up, down=down)[:len(seq) * up // down]
+
+    # saturate the results value to filter output type if needed
+    for i, r in enumerate(res):
+        res[i] = fixp_sat(t_b, r)
+
+    if down > 1:
+        dut = impl(b=b_fixp, m=down)
+    else:
+        dut = impl(b=b_fixp, l=up)
+
+    # driving
+    drv(t=t_b, seq=seq) \
+        | dut \
+        | Float \
+        | check(ref=res, cmp=fir_compare)
+
+    # optionally generate HDL code do co-simulation in verilator
+    if do_cosim:
+        cosim(f'{impl}', 'verilator', outdir=target, timeout=1000)
+
+    # simulation start
+    sim(target, check_activity=False)
+    return res
+
+
+@pytest.mark.parametrize('m', [2, 3, 5])
+def test_fir_decimate(m, seed, do_cosim):
+    # Set random seed
+    set_seed(seed)
+
+    log.info(f'Running {__name__} m: {m}, seed: {seed}')
+
+    t_b = Fixp[1, 15]
+
+    # genrate  random numbers in [-1,1)
+    seq = np.random.random(size=(100, )) * 2 - 1
+    log.debug(f'Generated sequence: {seq}')
+
+    res = fir_rate_sim(fir_decimate, t_b, seq, do_cosim=do_cosim, down=m)
+
+
+def test_fir_decimate_zero_taps(seed, do_cosim, target='build/fir'):
+    """[Zero taps of the polyphase subfilters, also the padding ones, need no
+    multipliers
+    """
+    set_seed(seed)
+
+    t_b = Fixp[1, 15]
+
+    # half-band filter leaves a single non-zero tap in the odd subfilter
+    b_fixp = [t_b(i) for i in firwin(11, 0.5)]
+
+    seq = np.random.random(size=(100, )) * 2 - 1
+    res = [fixp_sat(t_b, r) for r in upfirdn([float(i) for i in b_fixp], seq, down=2)[:len(seq) // 2]]
+
+    drv(t=t_b, seq=seq) \
+        | fir_decimate(b=b_fixp, m=2, name='dut') \
+        | Float \
+        | check(ref=res, cmp=fir_compare)
+
+    def gears(g):
+        yield g
+        for c in g.child:
+            yield from gears(c)
+
+    mults = [g for g in gears(find('/dut')) if g.definition.func.__name__ == 'mul']
+    assert len(mults) == sum(float(i) != 0 for i in b_fixp)
+
+    if do_cosim:
+        cosim('/dut', 'verilator', outdir=target, timeout=1000)
+
+    sim(target, check_activity=False)
+
+
+@pytest.mark.parametrize('l', [2, 3, 5])
+def test_fir_interpolate(l, seed, do_cosim):
+    # Set random seed
+    set_seed(seed)
+
+    log.info(f'Running {__name__} l: {l}, seed: {seed}')
+
+    t_b = Fixp[1, 15]
+
+    # genrate  random numbers in [-1,1)
+    seq = np.random.random(size=(100, )) * 2 - 1
+    log.debug(f'Generated sequence: {seq}')
+
+    res = fir_rate_sim(fir_interpolate, t_b, seq, do_cosim=do_cosim, up=l)
+
+
 # run individual test with python command
 if __name__ == '__main__':
     ## >> used to probe all signals
@@ -3,16 +3,23 @@ import random
 from math import pi, sin
 import traceback
 
+import numpy as np
 import pytest
 from scipy import signal
 
 # from pygears_control.lib import scope
-from pygears import reg
-from pygears.lib import check, drv
+from pygears import Intf, reg
+from pygears.hdl import hdlgen
+from pygears.lib import check, collect, drv, project, serialize, verif
 from pygears.sim import log, sim
 from pygears.sim.sim import cosim
-from pygears.typing import Fixp, Float
-from pygears_dsp.lib.iir import iir_df1dsos, iir_df2tsos
+from pygears.typing import Array, Fixp, Float, Tuple, Uint
+from pygears_dsp.lib.iir import (TSosCfg, iir_df1dsos, iir_df1dsos_cfg,
+                                 iir_df2tsos, iir_df2tsos_block, iir_df2tsos_cfg,
+                                 iir_df2tsos_channelized, iir_df2tsos_folded,
+                                 iir_dflasos)
+from pygears_dsp.lib.iir_plan import (SosNorm, response_norm, sos_order, sos_plan,
+                                      sos_response, sos_scale)
 from conftest import constant_seq, fixp_sat, random_choice_seq, random_seq, set_seed, sine_seq
 
 
@@ -208,6 +215,379 @@ def test_fir_sine(freq, impl, seed, do_cosim):
     res = iir_sim(impl, ftype, ftype, ftype, seq, do_cosim=do_cosim)
 
 
+@pytest.mark.parametrize('loop_stages', [1, 2, 3, 4])
+def test_iir_lookahead(loop_stages, seed, do_cosim):
+    log.info(f'Running test_iir_lookahead loop_stages: {loop_stages}, seed: {seed}')
+    set_seed(seed)
+
+    ftype = Fixp[5, 32]
+
+    seq = constant_seq(ftype, 10, 0)
+    seq.extend(random_seq(ftype, 100))
+    seq.extend(constant_seq(ftype, 10, 0))
+
+    iir_sim(iir_dflasos(loop_stages=loop_stages), ftype, ftype, ftype, seq, do_cosim=do_cosim)
+
+
+@pytest.mark.parametrize('impl', [iir_df1dsos, iir_df2tsos])
+def test_iir_prune(impl, seed, do_cosim, target='build/iir'):
+    """[Pruned sums need to give the same results as the full precision ones
+    """
+    log.info(f'Running test_iir_prune, seed: {seed}')
+    set_seed(seed)
+
+    ftype = Fixp[5, 32]
+
+    sos = signal.butter(N=5,
+                        Wn=30000 / 100000,
+                        btype='lowpass',
+                        analog=False,
+                        output='sos')
+
+    b = [[ftype(coef) for coef in s[0:3]] for s in sos]
+    a = [[ftype(coef) for coef in s[3:]] for s in sos]
+    gain = [ftype(1)] * len(b)
+
+    extremes = [[0 for i in range(50)]]
+    extremes.append([ftype.fmin * 0.5 for i in range(10)])
+    extremes.append([ftype.fmax * 0.5 for i in range(10)])
+    seq = random_choice_seq(extremes, 10)
+
+    verif(drv(t=ftype, seq=seq),
+          f=impl(a=a, b=b, gain=gain, ogain=ftype(1), prune_sum=True, name='dut'),
+          ref=impl(a=a, b=b, gain=gain, ogain=ftype(1)))
+
+    if do_cosim:
+        cosim('/dut', 'verilator', outdir=target, timeout=1000)
+
+    sim(target, check_activity=False)
+
+
+@pytest.mark.parametrize('clk_per_sample', [None, 5, 3])
+def test_iir_folded(clk_per_sample, seed, do_cosim, target='build/iir'):
+    """[Time-multiplexed sections need to give the same results as iir_df2tsos
+    """
+    log.info(f'Running test_iir_folded clk_per_sample: {clk_per_sample}, seed: {seed}')
+    set_seed(seed)
+
+    ftype = Fixp[5, 32]
+
+    sos = signal.butter(N=10,
+                        Wn=30000 / 100000,
+                        btype='lowpass',
+                        analog=False,
+                        output='sos')
+
+    b = [[ftype(coef) for coef in s[0:3]] for s in sos]
+    a = [[ftype(coef) for coef in s[3:]] for s in sos]
+    gain = [ftype(1)] * len(b)
+
+    seq = constant_seq(ftype, 10, 0)
+    seq.extend(random_seq(ftype, 100))
+    seq.extend(constant_seq(ftype, 10, 0))
+
+    verif(drv(t=ftype, seq=seq),
+          f=iir_df2tsos_folded(a=a, b=b, gain=gain, ogain=ftype(1), clk_per_sample=clk_per_sample, name='dut'),
+          ref=iir_df2tsos(a=a, b=b, gain=gain, ogain=ftype(1)))
+
+    if do_cosim:
+        cosim('/dut', 'verilator', outdir=target, timeout=1000)
+
+    sim(target, check_activity=False)
+
+
+def test_iir_folded_types(seed, do_cosim, target='build/iir'):
+    """[Sections with coefficients of different types need to give the same
+    results as iir_df2tsos
+    """
+    set_seed(seed)
+
+    ftype = Fixp[5, 32]
+
+    sos = signal.butter(N=4,
+                        Wn=30000 / 100000,
+                        btype='lowpass',
+                        analog=False,
+                        output='sos')
+
+    # first section is narrower than the rest
+    types = [Fixp[3, 16]] + [ftype] * (len(sos) - 1)
+    b = [[t(coef) for coef in s[0:3]] for t, s in zip(types, sos)]
+    a = [[t(coef) for coef in s[3:]] for t, s in zip(types, sos)]
+    gain = [t(1) for t in types]
+
+    seq = random_seq(ftype, 100)
+
+    verif(drv(t=ftype, seq=seq),
+          f=iir_df2tsos_folded(a=a, b=b, gain=gain, ogain=ftype(1), name='dut'),
+          ref=iir_df2tsos(a=a, b=b, gain=gain, ogain=ftype(1)))
+
+    if do_cosim:
+        cosim('/dut', 'verilator', outdir=target, timeout=1000)
+
+    sim(target, check_activity=False)
+
+
+def test_iir_folded_hdlgen(tmpdir):
+    ftype = Fixp[5, 32]
+    b = [[ftype(1), ftype(0.5), ftype(0)]] * 3
+    a = [[ftype(1), ftype(-0.5), ftype(0.25)]] * 3
+
+    iir_df2tsos_folded(Intf(ftype), a=a, b=b, gain=[ftype(1)] * 3, ogain=ftype(1), clk_per_sample=5, name='dut')
+    hdlgen('/dut', outdir=tmpdir)
+
+
+def test_iir_folded_rate():
+    ftype = Fixp[5, 32]
+    b = [[ftype(1), ftype(0), ftype(0)]]
+    a = [[ftype(1), ftype(0), ftype(0)]]
+
+    with pytest.raises(Exception):
+        drv(t=ftype, seq=[0]) | iir_df2tsos_folded(a=a, b=b, gain=[ftype(1)], ogain=ftype(1), clk_per_sample=2)
+
+
+@pytest.mark.parametrize('channels', [2, 4, 16])
+def test_iir_channelized(channels, seed, do_cosim, target='build/iir'):
+    log.info(f'Running test_iir_channelized channels: {channels}, seed: {seed}')
+    set_seed(seed)
+
+    ftype = Fixp[5, 32]
+
+    sos = signal.butter(N=5,
+                        Wn=30000 / 100000,
+                        btype='lowpass',
+                        analog=False,
+                        output='sos')
+
+    b = [[ftype(coef) for coef in s[0:3]] for s in sos]
+    a = [[ftype(coef) for coef in s[3:]] for s in sos]
+    gain = [ftype(1)] * len(b)
+
+    # genrate  random numbers in [-1,1) for each channel
+    seq = np.random.random(size=(50, channels)) * 2 - 1
+    log.debug(f'Generated sequence: {seq}')
+
+    # get result for each channel
+    res = np.array([signal.sosfilt(sos, seq[:, ch]) for ch in range(channels)]).T
+
+    # saturate the results value to filter output type if needed
+    res = [[fixp_sat(ftype, r) for r in row] for row in res]
+
+    # channel samples are interleaved
+    drv(t=Tuple[Uint[8], ftype], seq=[(ch, seq[n, ch]) for n in range(len(seq)) for ch in range(channels)]) \
+        | iir_df2tsos_channelized(a=a, b=b, gain=gain, ogain=ftype(1), channels=channels) \
+        | check(ref=[(res[n][ch], ch) for n in range(len(seq)) for ch in range(channels)],
+                cmp=lambda x, y: iir_compare(float(x[0]), float(y[0])) and x[1] == y[1])
+
+    if do_cosim:
+        cosim('/iir_df2tsos_channelized', 'verilator', outdir=target, timeout=1000)
+
+    sim(target, check_activity=False)
+
+
+@pytest.mark.parametrize('channels', [1, 3])
+def test_iir_channelized_order(channels, seed, do_cosim, target='build/iir'):
+    """[Channels arriving out of the round-robin order, also back to back,
+    need to use the up to date section state
+    """
+    log.info(f'Running test_iir_channelized_order channels: {channels}, seed: {seed}')
+    set_seed(seed)
+
+    ftype = Fixp[5, 32]
+
+    sos = signal.butter(N=5,
+                        Wn=30000 / 100000,
+                        btype='lowpass',
+                        analog=False,
+                        output='sos')
+
+    b = [[ftype(coef) for coef in s[0:3]] for s in sos]
+    a = [[ftype(coef) for coef in s[3:]] for s in sos]
+    gain = [ftype(1)] * len(b)
+
+    order = [random.randrange(channels) for _ in range(100)]
+    seq = np.random.random(size=(len(order), )) * 2 - 1
+
+    # filter each channel separately, and restore the arrival order
+    ref = [None] * len(order)
+    for ch in range(channels):
+        idx = [n for n, c in enumerate(order) if c == ch]
+        for n, r in zip(idx, signal.sosfilt(sos, seq[idx])):
+            ref[n] = (fixp_sat(ftype, r), ch)
+
+    drv(t=Tuple[Uint[8], ftype], seq=list(zip(order, seq))) \
+        | iir_df2tsos_channelized(a=a, b=b, gain=gain, ogain=ftype(1), channels=channels) \
+        | check(ref=ref, cmp=lambda x, y: iir_compare(float(x[0]), float(y[0])) and x[1] == y[1])
+
+    if do_cosim:
+        cosim('/iir_df2tsos_channelized', 'verilator', outdir=target, timeout=1000)
+
+    sim(target, check_activity=False)
+
+
+def test_iir_channelized_hdlgen(tmpdir):
+    ftype = Fixp[5, 32]
+    b = [[ftype(1), ftype(0.5), ftype(0)]] * 2
+    a = [[ftype(1), ftype(-0.5), ftype(0.25)]] * 2
+
+    iir_df2tsos_channelized(Intf(Tuple[Uint[2], ftype]), a=a, b=b, gain=[ftype(1)] * 2, ogain=ftype(1), channels=4,
+                            name='dut')
+    hdlgen('/dut', outdir=tmpdir)
+
+
+@pytest.mark.parametrize('p', [1, 2, 4])
+def test_iir_block(p, seed, do_cosim, target='build/iir'):
+    """[Block filtering needs to give the same results as iir_df2tsos, also
+    when the outputs saturate
+    """
+    log.info(f'Running test_iir_block p: {p}, seed: {seed}')
+    set_seed(seed)
+
+    ftype = Fixp[5, 32]
+
+    sos = signal.butter(N=5,
+                        Wn=30000 / 100000,
+                        btype='lowpass',
+                        analog=False,
+                        output='sos')
+
+    b = [[ftype(coef) for coef in s[0:3]] for s in sos]
+    a = [[ftype(coef) for coef in s[3:]] for s in sos]
+    gain = [ftype(1)] * len(b)
+
+    # full range and extreme values saturate the section outputs
+    seq = constant_seq(ftype, 10 * p, 0)
+    seq.extend(random_seq(ftype, 100 * p))
+    seq.extend(random.choice([ftype.max, ftype.min]) for _ in range(20 * p))
+    seq.extend(constant_seq(ftype, 10 * p, 0))
+    seq = seq[:len(seq) // p * p]
+
+    # reference filters the same samples one by one
+    ref = []
+    drv(t=ftype, seq=seq) \
+    | iir_df2tsos(a=a, b=b, gain=gain, ogain=ftype(1)) \
+    | collect(result=ref)
+
+    # driving p samples per transaction
+    res = []
+    drv(t=Array[ftype, p], seq=[seq[i:i + p] for i in range(0, len(seq), p)]) \
+    | iir_df2tsos_block(a=a, b=b, gain=gain, ogain=ftype(1)) \
+    | serialize \
+    | project \
+    | collect(result=res)
+
+    if do_cosim:
+        cosim('/iir_df2tsos_block', 'verilator', outdir=target, timeout=1000)
+
+    sim(target, check_activity=False)
+
+    assert res == ref
+
+
+@pytest.mark.parametrize('impl', [iir_df1dsos, iir_df2tsos])
+@pytest.mark.parametrize('snr', [40, 60, 80])
+@pytest.mark.parametrize('wn', [0.3, 0.05, 0.02])
+def test_iir_plan(snr, impl, wn, do_cosim, target='build/iir'):
+    """[Planned filter needs to reach the target SNR for the full scale sine,
+    also for the narrowband filters with the poles close to the unit circle
+    """
+    log.info(f'Running test_iir_plan snr: {snr}, impl: {impl}, wn: {wn}')
+
+    sos = signal.butter(N=6,
+                        Wn=wn,
+                        btype='lowpass',
+                        analog=False,
+                        output='sos')
+
+    params, ftype = sos_plan(sos, snr=snr)
+    log.info(f'Planned data type: {ftype}, coefficient type: {type(params["a"][0][0])}')
+
+    # sine within the passband, close to the full scale, with the frequency
+    # chosen so that the rounding errors do not repeat
+    n = np.arange(2000)
+    seq = list(0.9 * np.sin(2 * pi * 0.171 * wn * n))
+    ref = signal.sosfilt(sos, seq)
+
+    res = []
+    drv(t=ftype, seq=seq) \
+    | impl(**params) \
+    | Float \
+    | collect(result=res)
+
+    if do_cosim:
+        cosim(f'{impl}', 'verilator', outdir=target, timeout=1000)
+
+    sim(target, check_activity=False)
+
+    # allow for the sine below the full scale
+    err = np.array(res) - ref
+    assert 10 * np.log10(np.mean(ref**2) / np.mean(err**2)) > snr - 1
+
+
+@pytest.mark.parametrize('norm', [SosNorm.L2, SosNorm.LINF])
+def test_iir_plan_scale(norm):
+    sos = sos_order(signal.butter(N=10, Wn=30000 / 100000, output='sos'))
+    gain, ogain = sos_scale(sos, norm)
+
+    # response to every section output is normalized
+    cum = 1
+    for g, h in zip(gain, sos_response(sos)):
+        cum = cum * h * g
+        assert abs(response_norm(cum, norm) - 1) < 1e-9
+
+    # output gain restores the filter response
+    assert abs(response_norm(cum * ogain, SosNorm.LINF) - 1) < 1e-3
+
+
+@pytest.mark.parametrize('impl', [iir_df1dsos_cfg, iir_df2tsos_cfg])
+@pytest.mark.parametrize('prune_sum', [False, True])
+def test_iir_cfg(impl, prune_sum, seed, do_cosim, target='build/iir'):
+    log.info(f'Running test_iir_cfg prune_sum: {prune_sum}, seed: {seed}')
+    set_seed(seed)
+
+    ftype = Fixp[5, 32]
+
+    sos = signal.butter(N=5,
+                        Wn=30000 / 100000,
+                        btype='lowpass',
+                        analog=False,
+                        output='sos')
+
+    cfg_t = TSosCfg[ftype, len(sos), ftype, ftype]
+    cfg = cfg_t(([list(s[3:]) for s in sos], [list(s[0:3]) for s in sos], [1] * len(sos), 1))
+
+    # filter is initialized to block everything
+    init = cfg_t(([[1, 0, 0]] * len(sos), [[0, 0, 0]] * len(sos), [1] * len(sos), 1))
+
+    # coefficients are loaded while the filter is fed with zeros
+    seq = constant_seq(ftype, 10, 0)
+    seq.extend(random_seq(ftype, 100))
+    seq.extend(constant_seq(ftype, 10, 0))
+
+    ref = signal.sosfilt(sos, seq)
+    fp_ref = [fixp_sat(ftype, float(r)) for r in ref]
+
+    impl(drv(t=ftype, seq=seq), drv(t=cfg_t, seq=[cfg]), init=init, prune_sum=prune_sum) \
+        | Float \
+        | check(ref=fp_ref, cmp=iir_compare)
+
+    if do_cosim:
+        cosim(f'{impl}', 'verilator', outdir=target, timeout=1000)
+
+    sim(target, check_activity=False)
+
+
+@pytest.mark.parametrize('impl', [iir_df1dsos_cfg, iir_df2tsos_cfg])
+@pytest.mark.parametrize('init', [False, True])
+def test_iir_cfg_hdlgen(impl, init, tmpdir):
+    ftype = Fixp[5, 32]
+    cfg_t = TSosCfg[ftype, 2, ftype, ftype]
+
+    # coefficient register needs to be translatable with and without reset values
+    impl(Intf(ftype), Intf(cfg_t), init=cfg_t.decode(0) if init else None, name='dut')
+    hdlgen('/dut', outdir=tmpdir)
+
+
 # run individual test with python command
 if __name__ == '__main__':
     # reg['logger/sim/error'] = 'debug'  # on error open cmdline debugger
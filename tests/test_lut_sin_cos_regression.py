@@ -0,0 +1,99 @@
+import math
+import random
+import traceback
+
+import pytest
+
+from pygears import Intf
+from pygears.hdl import hdlgen
+from pygears.lib import check, drv, verif
+from pygears.sim import log, sim
+from pygears.sim.sim import cosim
+from pygears.typing import Uint
+from pygears_dsp.lib.cordic import cordic_params, cordic_sin_cos
+from pygears_dsp.lib.lut_sin_cos import (lut_sin_cos, lut_sin_cos_amplitude,
+                                         lut_sin_cos_report)
+from conftest import set_seed
+
+
+@pytest.mark.parametrize('ow, taylor, norm_gain', [(12, False, False), (12, True, False),
+                                                   (16, True, True)])
+def test_lut_sin_cos(ow, taylor, norm_gain, seed, do_cosim, target='build/lut_sin_cos'):
+    # Set random seed
+    set_seed(seed)
+
+    pw = cordic_params(iw=12, ow=ow)[0]
+    log.info(f'Running {__name__} ow: {ow}, taylor: {taylor}, norm_gain: {norm_gain}, seed: {seed}')
+
+    phase_seq = [random.randint(0, 2**pw - 1) for _ in range(200)]
+    angles = [2 * math.pi * p / 2**pw for p in phase_seq]
+    amp = lut_sin_cos_amplitude(ow, pw, norm_gain=norm_gain)
+
+    sin, cos = drv(t=Uint[pw], seq=phase_seq) \
+        | lut_sin_cos(ow=ow, norm_gain_sin=norm_gain, norm_gain_cos=norm_gain, taylor=taylor,
+                      name='dut')
+
+    # results are within an output LSB
+    cmp = lambda res, ref: abs(int(res) - float(ref)) <= 1
+    sin | check(ref=[amp * math.sin(a) for a in angles], cmp=cmp)
+    cos | check(ref=[amp * math.cos(a) for a in angles], cmp=cmp)
+
+    if do_cosim:
+        cosim('/dut', 'verilator', outdir=target, timeout=1000)
+
+    sim(target)
+
+
+def test_lut_sin_cos_cordic(seed, do_cosim, target='build/lut_sin_cos'):
+    # Set random seed
+    set_seed(seed)
+
+    pw = 19
+    phase_seq = [random.randint(0, 2**pw - 1) for _ in range(200)]
+
+    # both round to the same amplitude, so they differ at most by a LSB
+    verif(drv(t=Uint[pw], seq=phase_seq),
+          f=lut_sin_cos(ow=12, taylor=True, name='dut'),
+          ref=cordic_sin_cos(ow=12),
+          cmp=lambda res, ref: abs(int(res) - int(ref)) <= 1)
+
+    if do_cosim:
+        cosim('/dut', 'verilator', outdir=target, timeout=1000)
+
+    sim(target)
+
+
+@pytest.mark.parametrize('taylor', [False, True])
+def test_lut_sin_cos_hdlgen(taylor, tmpdir):
+    # the default LUT of 4096 entries needs to translate as well
+    pw = cordic_params(iw=12, ow=12)[0]
+    lut_sin_cos(Intf(Uint[pw]), ow=12, taylor=taylor, name='dut')
+    hdlgen('/dut', outdir=tmpdir)
+
+
+@pytest.mark.parametrize('ow', [8, 12, 16])
+def test_lut_sin_cos_report(ow):
+    pw = cordic_params(iw=12, ow=ow)[0]
+
+    direct = lut_sin_cos_report(ow, pw)
+    taylor = lut_sin_cos_report(ow, pw, taylor=True)
+    log.info(f'ow: {ow}, direct: {direct}, taylor: {taylor}')
+
+    # LUT sized from ow keeps the error within an output LSB
+    assert direct['max_err'] < 1
+    assert taylor['max_err'] < 1
+
+    # interpolation needs about half as many address bits
+    assert taylor['lut_bits'] <= direct['lut_bits'] // 2 + 1
+    assert taylor['lut_words'] < direct['lut_words']
+
+
+# run individual test with python command
+if __name__ == '__main__':
+    try:
+        test_lut_sin_cos(12, True, False, 12, do_cosim=False)
+        log.info("\033[92m //==== PASS ====// \033[90m")
+    except:
+        # printing stack trace
+        traceback.print_exc()
+        log.info("\033[91m //==== FAILED ====// \033[90m")
@@ -0,0 +1,56 @@
+import traceback
+
+import pytest
+from scipy.signal import firwin
+
+from pygears.sim import log
+from pygears.typing import Fixp
+from pygears_dsp.lib.mcm import csd, fundamental, mcm_plan, mcm_report
+
+
+def test_csd():
+    for k in range(-1000, 1000):
+        digits = csd(k)
+
+        # digits need to sum up to the number
+        assert sum(sign << shift for shift, sign in digits) == k
+
+        # no two consecutive digits are non-zero
+        for (shift0, _), (shift1, _) in zip(digits, digits[1:]):
+            assert shift1 - shift0 > 1
+
+
+@pytest.mark.parametrize('num', [8, 31, 64])
+def test_mcm_plan(num):
+    b = firwin(num, [0.05, 0.95], width=0.05, pass_zero=False)
+    b_fixp = [Fixp[1, 15](i) for i in b]
+
+    subexprs, terms = mcm_plan(b_fixp)
+
+    # every fundamental needs to be assembled correctly from the terms
+    sub_val = [(1 << d) + s for d, s in subexprs]
+    for fund, fund_terms in terms.items():
+        val = 0
+        for shift, sign, src in fund_terms:
+            val += sign * ((1 if src is None else sub_val[src]) << shift)
+
+        assert val == fund
+
+    report = mcm_report(b_fixp)
+    log.info(f'{num} taps adders: {report}')
+
+    # sharing needs to be cheaper than plain CSD recoding of each coefficient
+    csd_adders = sum(len(csd(fundamental(int(k))[1])) - 1 for k in b_fixp if int(k))
+    assert report['total'] <= csd_adders
+    assert report['total'] == sum(report['coef_adders']) + report['shared_adders']
+
+
+# run individual test with python command
+if __name__ == '__main__':
+    try:
+        test_mcm_plan(31)
+        log.info("\033[92m //==== PASS ====// \033[90m")
+    except:
+        # printing stack trace
+        traceback.print_exc()
+        log.info("\033[91m //==== FAILED ====// \033[90m")
@@ -0,0 +1,95 @@
+import math
+import traceback
+
+import numpy as np
+import pytest
+
+from pygears import Intf, clear
+from pygears.hdl import hdlgen
+from pygears.lib import collect, drv
+from pygears.sim import log, sim
+from pygears.sim.sim import cosim
+from pygears.typing import Uint
+from pygears_dsp.lib.cordic import cordic_params
+from pygears_dsp.lib.nco import nco, nco_fcw
+from conftest import set_seed
+
+
+def sfdr(x):
+    # ratio of the carrier to the largest spur, carrier spreads over few bins
+    # due to the window
+    spectrum = abs(np.fft.rfft(np.array(x) * np.blackman(len(x))))
+    k = np.argmax(spectrum)
+    spurs = spectrum.copy()
+    spurs[max(0, k - 6):k + 7] = 0
+
+    return 20 * np.log10(spectrum[k] / max(spurs))
+
+
+@pytest.mark.parametrize('ow, lut_bits', [(12, 4), (16, 6), (16, 8)])
+def test_nco(ow, lut_bits, seed, do_cosim, target='build/nco'):
+    # Set random seed
+    set_seed(seed)
+
+    aw = 24
+    num = 200
+    fcw = nco_fcw(np.random.random() / 2, aw)
+    log.info(f'Running {__name__} ow: {ow}, lut_bits: {lut_bits}, fcw: {fcw}, seed: {seed}')
+
+    sin, cos = [], []
+    sin_cos = nco(drv(t=Uint[aw], seq=[fcw]), ow=ow, lut_bits=lut_bits)
+    sin_cos[0] | collect(result=sin)
+    sin_cos[1] | collect(result=cos)
+
+    # optionally generate HDL code do co-simulation in verilator
+    if do_cosim:
+        cosim('/nco', 'verilator', outdir=target, timeout=1000)
+
+    # NCO runs forever, one sample per clock cycle after the pipeline latency
+    sim(target, timeout=num)
+    assert len(sin) > num - 20
+
+    # reference is computed from the truncated phase, within a LSB
+    pw = cordic_params(iw=ow, ow=ow)[0]
+    amp = 2**(ow - 1) - 1
+    for i, (s, c) in enumerate(zip(sin, cos)):
+        phase = 2 * math.pi * ((i * int(fcw)) % 2**aw >> (aw - pw)) / 2**pw
+        assert abs(int(s) - amp * math.sin(phase)) < 1
+        assert abs(int(c) - amp * math.cos(phase)) < 1
+
+
+def test_nco_dither(do_cosim, target='build/nco'):
+    aw = 24
+    num = 4096
+
+    # coarse phase, so that the truncation spurs dominate
+    res = {}
+    for dither in [False, True]:
+        sin = []
+        nco(drv(t=Uint[aw], seq=[nco_fcw(0.0123456, aw)]), ow=16, pw=10, dither=dither)[0] \
+            | collect(result=sin)
+
+        sim(target, timeout=num + 20)
+        res[dither] = sfdr([int(s) for s in sin[:num]])
+        clear()
+
+    log.info(f'SFDR without dither: {res[False]:.1f}dB, with dither: {res[True]:.1f}dB')
+    assert res[True] > res[False] + 2
+
+
+@pytest.mark.parametrize('init, dither', [(None, False), (1000, True)])
+def test_nco_hdlgen(init, dither, tmpdir):
+    # phase accumulator needs to be translatable with and without reset value
+    nco(Intf(Uint[24]), ow=16, init=init, dither=dither, name='dut')
+    hdlgen('/dut', outdir=tmpdir)
+
+
+# run individual test with python command
+if __name__ == '__main__':
+    try:
+        test_nco(16, 6, 12, do_cosim=False)
+        log.info("\033[92m //==== PASS ====// \033[90m")
+    except:
+        # printing stack trace
+        traceback.print_exc()
+        log.info("\033[91m //==== FAILED ====// \033[90m")